@@ -3,13 +3,16 @@ from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from models import User
+from sqlalchemy import delete, select, update
+from models import RefreshToken, User
+import hashlib
 import os
+import secrets
 
 SECRET_KEY = os.getenv("JWT_SECRET", "your-secret-key")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+REFRESH_TOKEN_EXPIRE_DAYS = 30
 
 pwd_context = CryptContext(schemes=["argon2", "bcrypt"], deprecated="auto")
 
@@ -74,3 +77,98 @@ async def authenticate_user(
     if not user or not verify_password(password, user.hashed_password):
         return None
     return user
+
+
+def hash_refresh_token(token: str) -> str:
+    # Los refresh tokens son aleatorios de 256 bits: sha256 basta, no hace
+    # falta argon2 (que es justo lo que queremos evitar en /auth/refresh)
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+async def create_refresh_token(db: AsyncSession, user_id: int) -> str:
+    token = secrets.token_urlsafe(32)
+    db.add(
+        RefreshToken(
+            user_id=user_id,
+            token_hash=hash_refresh_token(token),
+            expires_at=datetime.utcnow()
+            + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS),
+        )
+    )
+    await db.commit()
+    return token
+
+
+async def rotate_refresh_token(
+    db: AsyncSession, token: str
+) -> Optional[tuple[int, str]]:
+    """Canjear un refresh token por uno nuevo (el viejo queda revocado).
+
+    Devuelve (user_id, nuevo_token) o None si el token no es válido.
+
+    Si llega un token ya revocado se asume robo y se revocan todos los
+    refresh tokens del usuario.
+    """
+    token_hash = hash_refresh_token(token)
+    now = datetime.utcnow()
+
+    # Revocar de forma atómica: dos refresh concurrentes no ganan ambos
+    result = await db.execute(
+        update(RefreshToken)
+        .where(
+            RefreshToken.token_hash == token_hash,
+            RefreshToken.revoked_at.is_(None),
+            RefreshToken.expires_at > now,
+        )
+        .values(revoked_at=now)
+        .returning(RefreshToken.user_id)
+    )
+    user_id = result.scalar_one_or_none()
+
+    if user_id is None:
+        existing = await db.execute(
+            select(RefreshToken).where(
+                RefreshToken.token_hash == token_hash
+            )
+        )
+        reused = existing.scalar_one_or_none()
+        if reused and reused.revoked_at is not None:
+            await revoke_user_refresh_tokens(db, reused.user_id)
+        await db.commit()
+        return None
+
+    return user_id, await create_refresh_token(db, user_id)
+
+
+async def revoke_refresh_token(db: AsyncSession, token: str) -> bool:
+    result = await db.execute(
+        update(RefreshToken)
+        .where(
+            RefreshToken.token_hash == hash_refresh_token(token),
+            RefreshToken.revoked_at.is_(None),
+        )
+        .values(revoked_at=datetime.utcnow())
+    )
+    await db.commit()
+    return result.rowcount > 0
+
+
+async def revoke_user_refresh_tokens(db: AsyncSession, user_id: int):
+    await db.execute(
+        update(RefreshToken)
+        .where(
+            RefreshToken.user_id == user_id,
+            RefreshToken.revoked_at.is_(None),
+        )
+        .values(revoked_at=datetime.utcnow())
+    )
+
+
+async def purge_expired_refresh_tokens(db: AsyncSession) -> int:
+    result = await db.execute(
+        delete(RefreshToken).where(
+            RefreshToken.expires_at < datetime.utcnow()
+        )
+    )
+    await db.commit()
+    return result.rowcount
@@ -0,0 +1,237 @@
+"""Benchmark del data layer caliente: ORM vs Core + DTOs con slots.
+
+Compara, por mensaje:
+
+- ``send``: guardar un mensaje y armar el payload del evento. ``orm`` es el
+  camino anterior (``Message`` + flush + commit + refresh); ``core`` es
+  ``hotpath.insert_message`` (INSERT ... RETURNING, sin refresh).
+- ``history``: leer el historial de un room. ``orm`` hace
+  ``select(Message, User)``; ``core`` usa ``hotpath.fetch_room_history``.
+
+Mide tiempo por operación, pico de memoria asignada por operación
+(tracemalloc) y memoria retenida por fila del historial. Corre en proceso,
+contra SQLite en memoria y sin red. Uso:
+
+    python -m benchmarks.hotpath --messages 2000 --history 200
+"""
+
+import argparse
+import asyncio
+import gc
+import time
+import tracemalloc
+
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import (
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+from sqlalchemy.future import select
+from sqlalchemy.pool import StaticPool
+
+from hotpath import fetch_room_history, insert_message
+from models import Base, Message, Room, User
+
+
+async def orm_send(session_factory, sender_id: int, username: str, room_id: int):
+    async with session_factory() as db:
+        message = Message(content="hola", sender_id=sender_id, room_id=room_id)
+        db.add(message)
+        await db.flush()
+        await db.execute(
+            update(Room)
+            .where(Room.id == room_id)
+            .values(
+                message_count=Room.message_count + 1,
+                last_activity_at=message.created_at,
+            )
+        )
+        await db.commit()
+        await db.refresh(message)
+        return {
+            'id': message.id,
+            'message': message.content,
+            'username': username,
+            'room_id': room_id,
+            'timestamp': message.created_at.isoformat(),
+        }
+
+
+async def core_send(session_factory, sender_id: int, username: str, room_id: int):
+    async with session_factory() as db:
+        message = await insert_message(db, sender_id, room_id, "hola")
+        await db.commit()
+    return message.as_event(username)
+
+
+async def orm_history_rows(db, room_id: int, limit: int):
+    result = await db.execute(
+        select(Message, User)
+        .join(User, Message.sender_id == User.id)
+        .where(Message.room_id == room_id)
+        .order_by(Message.created_at.desc())
+        .limit(limit)
+    )
+    return result.all()
+
+
+async def orm_history(session_factory, room_id: int, limit: int):
+    async with session_factory() as db:
+        rows = await orm_history_rows(db, room_id, limit)
+        messages = [
+            {
+                'id': message.id,
+                'message': message.content,
+                'username': user.username,
+                'sender_id': user.id,
+                'room_id': message.room_id,
+                'timestamp': message.created_at.isoformat(),
+            }
+            for message, user in rows
+        ]
+    return list(reversed(messages))
+
+
+async def core_history(session_factory, room_id: int, limit: int):
+    async with session_factory() as db:
+        history = await fetch_room_history(db, room_id, limit)
+    return [row.as_dict() for row in history]
+
+
+async def measure(operation, iterations: int) -> dict:
+    """Tiempo y pico de memoria asignada por operación"""
+    for _ in range(min(iterations, 20)):
+        await operation()
+
+    gc.collect()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        await operation()
+    elapsed = time.perf_counter() - start
+
+    # Pasada aparte: tracemalloc distorsiona los tiempos
+    alloc_iterations = max(iterations // 10, 1)
+    tracemalloc.start()
+    peak_total = 0
+    for _ in range(alloc_iterations):
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        await operation()
+        _, peak = tracemalloc.get_traced_memory()
+        peak_total += peak - before
+    tracemalloc.stop()
+
+    return {
+        "us_per_op": elapsed / iterations * 1e6,
+        "peak_kib_per_op": peak_total / alloc_iterations / 1024,
+    }
+
+
+async def retained_bytes_per_row(fetch, session_factory, room_id, limit):
+    """Memoria que ocupan las filas del historial mientras se mantienen"""
+    async with session_factory() as db:
+        gc.collect()
+        tracemalloc.start()
+        before, _ = tracemalloc.get_traced_memory()
+        rows = await fetch(db, room_id, limit)
+        gc.collect()
+        after, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return (after - before) / len(rows)
+
+
+async def setup_db():
+    engine = create_async_engine(
+        "sqlite+aiosqlite:///:memory:", poolclass=StaticPool
+    )
+    session_factory = async_sessionmaker(
+        engine, class_=AsyncSession, expire_on_commit=True
+    )
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with session_factory() as db:
+        db.add(
+            User(
+                id=1,
+                username="bench",
+                email="bench@bench.local",
+                hashed_password="x",
+            )
+        )
+        db.add_all([Room(id=1, name="send"), Room(id=2, name="history")])
+        await db.commit()
+    return engine, session_factory
+
+
+async def run(messages: int, history: int) -> dict:
+    engine, session_factory = await setup_db()
+
+    async with session_factory() as db:
+        for _ in range(history):
+            await insert_message(db, 1, 2, "historial")
+        await db.commit()
+
+    results = {
+        "send": {
+            "orm": await measure(
+                lambda: orm_send(session_factory, 1, "bench", 1), messages
+            ),
+            "core": await measure(
+                lambda: core_send(session_factory, 1, "bench", 1), messages
+            ),
+        },
+        "history": {
+            "orm": await measure(
+                lambda: orm_history(session_factory, 2, history),
+                max(messages // 20, 1),
+            ),
+            "core": await measure(
+                lambda: core_history(session_factory, 2, history),
+                max(messages // 20, 1),
+            ),
+        },
+    }
+    results["history"]["orm"]["retained_bytes_per_row"] = (
+        await retained_bytes_per_row(
+            orm_history_rows, session_factory, 2, history
+        )
+    )
+    results["history"]["core"]["retained_bytes_per_row"] = (
+        await retained_bytes_per_row(
+            fetch_room_history, session_factory, 2, history
+        )
+    )
+
+    await engine.dispose()
+    return results
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--history", type=int, default=200)
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args.messages, args.history))
+
+    print(
+        f"Hot path: {args.messages} mensajes, historial de {args.history}"
+    )
+    print(
+        f"{'path':<8} {'mode':<6} {'us/op':>10} {'peak KiB/op':>12} "
+        f"{'bytes/row':>10}"
+    )
+    for path, modes in results.items():
+        for mode, stats in modes.items():
+            retained = stats.get("retained_bytes_per_row")
+            retained = "-" if retained is None else round(retained)
+            print(
+                f"{path:<8} {mode:<6} {stats['us_per_op']:>10.1f} "
+                f"{stats['peak_kib_per_op']:>12.1f} "
+                f"{retained:>10}"
+            )
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,156 @@
+"""Benchmark de reconnect storm: join por room vs auto_join.
+
+Simula que todos los usuarios se reconectan a la vez y compara:
+
+- ``per_room``: ``authenticate`` + un ``join_room`` por cada room (antes).
+- ``auto_join``: ``authenticate`` con ``auto_join`` (una sola query).
+
+Corre en proceso, contra SQLite en memoria y sin red. Uso:
+
+    python -m benchmarks.reconnect_storm --users 200 --rooms 50
+"""
+
+import argparse
+import asyncio
+import time
+
+from sqlalchemy.ext.asyncio import (
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+from sqlalchemy.pool import StaticPool
+
+import main
+from auth import create_access_token
+from models import Base, Room, RoomMembership, User
+
+
+async def seed(session_factory, users: int, rooms_per_user: int):
+    """Crear usuarios y DMs de forma que cada usuario tenga N rooms"""
+    async with session_factory() as db:
+        db.add_all(
+            User(
+                id=i + 1,
+                username=f"user{i}",
+                email=f"user{i}@bench.local",
+                hashed_password="x",
+            )
+            for i in range(users)
+        )
+        await db.flush()
+
+        pairs = [
+            (i, (i + j) % users)
+            for i in range(users)
+            for j in range(1, rooms_per_user // 2 + 1)
+        ]
+        rooms = [
+            Room(name=f"user{a}_user{b}", is_private=True, room_type="dm")
+            for a, b in pairs
+        ]
+        db.add_all(rooms)
+        await db.flush()
+
+        db.add_all(
+            RoomMembership(user_id=user + 1, room_id=room.id)
+            for room, pair in zip(rooms, pairs, strict=True)
+            for user in pair
+        )
+        await db.commit()
+
+        result = await db.execute(
+            RoomMembership.__table__.select().with_only_columns(
+                RoomMembership.user_id, RoomMembership.room_id
+            )
+        )
+        memberships = {}
+        for user_id, room_id in result.all():
+            memberships.setdefault(user_id, []).append(room_id)
+        return memberships
+
+
+async def run_storm(mode: str, users: int, memberships: dict) -> dict:
+    stats = {"client_events": 0, "server_emits": 0, "deliveries": 0}
+
+    async def counting_emit(event, data=None, room=None, **kwargs):
+        stats["server_emits"] += 1
+        if room is None:
+            stats["deliveries"] += len(main.connected_users)
+        else:
+            stats["deliveries"] += len(
+                list(main.sio.manager.get_participants("/", room))
+            )
+
+    main.sio.emit = counting_emit
+    main.connected_users.clear()
+
+    sids = []
+    for i in range(users):
+        sids.append(await main.sio.manager.connect(f"{mode}-{i}", "/"))
+
+    start = time.perf_counter()
+    for i, sid in enumerate(sids):
+        user_id = i + 1
+        token = create_access_token({"sub": str(user_id)})
+
+        if mode == "auto_join":
+            stats["client_events"] += 1
+            await main.authenticate(sid, {"token": token, "auto_join": True})
+        else:
+            stats["client_events"] += 1
+            await main.authenticate(sid, {"token": token})
+            for room_id in memberships.get(user_id, []):
+                stats["client_events"] += 1
+                await main.join_room(sid, {"room_id": room_id})
+    stats["seconds"] = time.perf_counter() - start
+
+    for sid in sids:
+        await main.sio.manager.disconnect(sid, "/")
+    return stats
+
+
+async def run(users: int, rooms_per_user: int):
+    engine = create_async_engine(
+        "sqlite+aiosqlite:///:memory:", poolclass=StaticPool
+    )
+    session_factory = async_sessionmaker(
+        engine, class_=AsyncSession, expire_on_commit=False
+    )
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    main.AsyncSessionLocal = session_factory
+    memberships = await seed(session_factory, users, rooms_per_user)
+
+    results = {}
+    for mode in ("per_room", "auto_join"):
+        results[mode] = await run_storm(mode, users, memberships)
+
+    await engine.dispose()
+    return results
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--rooms", type=int, default=50)
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args.users, args.rooms))
+
+    print(f"Reconnect storm: {args.users} usuarios x {args.rooms} rooms")
+    print(
+        f"{'mode':<10} {'events':>10} {'emits':>10} "
+        f"{'deliveries':>12} {'seconds':>9}"
+    )
+    for mode, stats in results.items():
+        print(
+            f"{mode:<10} {stats['client_events']:>10} "
+            f"{stats['server_emits']:>10} {stats['deliveries']:>12} "
+            f"{stats['seconds']:>9.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,383 @@
+"""Suite de micro-benchmarks de auth, serialización y handlers.
+
+Corre en proceso y sin red (la DB es SQLite en memoria). Cubre:
+
+- ``auth.*``: ``create_access_token`` / ``verify_token`` y el costo de
+  hashear/verificar passwords con los parámetros configurados en
+  ``pwd_context``.
+- ``serialization.*``: armar los dicts de mensajes y codificarlos a JSON.
+- ``handlers.*``: ``send_message`` (Socket.IO, con broadcast) y
+  ``GET /messages/{room_id}`` (ASGI en proceso).
+
+Los resultados se guardan como JSON para comparar entre commits:
+
+    python -m benchmarks.suite --save benchmarks/baselines/baseline.json
+    python -m benchmarks.suite --compare benchmarks/baselines/baseline.json
+
+Con ``--compare`` el exit code es 1 si algún benchmark es más lento que el
+baseline por encima de ``--threshold``.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import inspect
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from datetime import datetime
+
+# Regresión: mediana actual / mediana del baseline
+DEFAULT_THRESHOLD = 1.25
+DEFAULT_ROUNDS = 5
+HISTORY_PAGE_SIZE = 50
+
+
+@dataclass
+class Benchmark:
+    name: str
+    operation: Callable
+    number: int
+    params: dict = field(default_factory=dict)
+    # Se llama al final de cada ronda (p. ej. vaciar colas de broadcast)
+    after_round: Callable | None = None
+
+
+def auth_benchmarks() -> list[Benchmark]:
+    from auth import (
+        create_access_token,
+        get_password_hash,
+        pwd_context,
+        verify_password,
+        verify_token,
+    )
+
+    token = create_access_token({"sub": "1"})
+    hashed = get_password_hash("correct horse battery staple")
+    handler = pwd_context.handler()
+    hash_params = {"scheme": handler.name}
+    # argon2: default_rounds es el time_cost; bcrypt solo usa rounds
+    for name in ("default_rounds", "memory_cost", "parallelism"):
+        if getattr(handler, name, None) is not None:
+            hash_params[name] = getattr(handler, name)
+
+    return [
+        Benchmark(
+            "auth.create_access_token",
+            lambda: create_access_token({"sub": "1"}),
+            number=2000,
+        ),
+        Benchmark("auth.verify_token", lambda: verify_token(token), 2000),
+        Benchmark(
+            "auth.hash_password",
+            lambda: get_password_hash("correct horse battery staple"),
+            number=5,
+            params=hash_params,
+        ),
+        Benchmark(
+            "auth.verify_password",
+            lambda: verify_password("correct horse battery staple", hashed),
+            number=5,
+            params=hash_params,
+        ),
+    ]
+
+
+def serialization_benchmarks() -> list[Benchmark]:
+    from hotpath import HistoryRow, MessageRow
+
+    now = datetime(2025, 1, 1, 12, 0, 0)
+    message = MessageRow(1, 1, 1, "hola, ¿cómo va?", now)
+    rows = [
+        HistoryRow(i, f"mensaje {i}", 1, now, 1, "alice")
+        for i in range(HISTORY_PAGE_SIZE)
+    ]
+    page = {"messages": [row.as_dict() for row in rows]}
+    batch = {"messages": [message.as_event("alice")] * HISTORY_PAGE_SIZE}
+
+    return [
+        Benchmark(
+            "serialization.message_event",
+            lambda: message.as_event("alice"),
+            number=20000,
+        ),
+        Benchmark(
+            "serialization.history_page_dicts",
+            lambda: [row.as_dict() for row in rows],
+            number=1000,
+        ),
+        Benchmark(
+            "serialization.history_page_json",
+            lambda: json.dumps(page),
+            number=1000,
+        ),
+        Benchmark(
+            "serialization.broadcast_batch_json",
+            lambda: json.dumps(batch),
+            number=1000,
+        ),
+    ]
+
+
+@contextlib.asynccontextmanager
+async def handler_benchmarks():
+    """Handlers reales contra SQLite en memoria; restaura ``main`` al salir"""
+    from httpx import ASGITransport, AsyncClient
+    from sqlalchemy.ext.asyncio import (
+        AsyncSession,
+        async_sessionmaker,
+        create_async_engine,
+    )
+    from sqlalchemy.pool import StaticPool
+
+    import main
+    from auth import create_access_token
+    from hotpath import SocketSession, insert_message
+    from models import Base, Room, RoomMembership, User
+
+    engine = create_async_engine(
+        "sqlite+aiosqlite:///:memory:", poolclass=StaticPool
+    )
+    session_factory = async_sessionmaker(engine, class_=AsyncSession)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with session_factory() as db:
+        db.add_all(
+            [
+                User(
+                    id=1,
+                    username="alice",
+                    email="alice@bench.local",
+                    hashed_password="x",
+                ),
+                Room(id=1, name="send"),
+                Room(id=2, name="history"),
+            ]
+        )
+        await db.flush()
+        db.add(RoomMembership(user_id=1, room_id=2))
+        for i in range(HISTORY_PAGE_SIZE * 4):
+            await insert_message(db, 1, 2, f"mensaje {i}")
+        await db.commit()
+
+    async def get_bench_db():
+        async with session_factory() as db:
+            yield db
+
+    async def noop_emit(event, data=None, room=None, **kwargs):
+        pass
+
+    original_session = main.AsyncSessionLocal
+    original_emit = main.sio.emit
+    main.AsyncSessionLocal = session_factory
+    main.sio.emit = noop_emit
+    main.app.dependency_overrides[main.get_read_db] = get_bench_db
+    main.connected_users["bench-sid"] = SocketSession(
+        user_id=1, username="alice", status="online", sid="bench-sid"
+    )
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': '1'})}"}
+    payload = {"room_id": 1, "message": "hola"}
+
+    transport = ASGITransport(app=main.socket_app)
+    try:
+        async with AsyncClient(
+            transport=transport, base_url="http://bench"
+        ) as client:
+            # Los prints de debug de los handlers son parte del costo, pero
+            # no deben ensuciar la salida
+            with (
+                open(os.devnull, "w") as devnull,
+                contextlib.redirect_stdout(devnull),
+            ):
+                yield [
+                    Benchmark(
+                        "handlers.send_message",
+                        lambda: main.send_message("bench-sid", payload),
+                        number=300,
+                        after_round=main.broadcaster.drain,
+                    ),
+                    Benchmark(
+                        "handlers.get_room_messages",
+                        lambda: client.get(
+                            f"/messages/2?limit={HISTORY_PAGE_SIZE}",
+                            headers=headers,
+                        ),
+                        number=200,
+                    ),
+                ]
+    finally:
+        await main.broadcaster.close()
+        main.connected_users.pop("bench-sid", None)
+        main.app.dependency_overrides.pop(main.get_read_db, None)
+        main.sio.emit = original_emit
+        main.AsyncSessionLocal = original_session
+        await engine.dispose()
+
+
+async def time_benchmark(bench: Benchmark, rounds: int, scale: float) -> dict:
+    """Mediana y mínimo del tiempo por operación sobre ``rounds`` rondas"""
+    number = max(int(bench.number * scale), 1)
+    is_async = inspect.iscoroutinefunction(bench.operation)
+
+    async def call():
+        result = bench.operation()
+        if is_async or inspect.isawaitable(result):
+            await result
+
+    # Warmup (caches, conexiones, imports tardíos)
+    await call()
+
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(number):
+            await call()
+        timings.append((time.perf_counter() - start) / number)
+        if bench.after_round is not None:
+            await bench.after_round()
+
+    median = statistics.median(timings)
+    stats = {
+        "number": number,
+        "rounds": rounds,
+        "median_us": median * 1e6,
+        "min_us": min(timings) * 1e6,
+        "ops_per_sec": 1 / median,
+    }
+    if bench.params:
+        stats["params"] = bench.params
+    return stats
+
+
+async def run_suite(
+    rounds: int = DEFAULT_ROUNDS,
+    scale: float = 1.0,
+    only: str | None = None,
+) -> dict:
+    results = {}
+
+    async def run_all(benchmarks: list[Benchmark]):
+        for bench in benchmarks:
+            if only and not bench.name.startswith(only):
+                continue
+            results[bench.name] = await time_benchmark(bench, rounds, scale)
+
+    await run_all(auth_benchmarks())
+    await run_all(serialization_benchmarks())
+    # El setup de handlers (DB + app) solo si algún handler entra en --only
+    if not only or only.startswith("handlers") or "handlers".startswith(only):
+        async with handler_benchmarks() as benchmarks:
+            await run_all(benchmarks)
+    return results
+
+
+def git_commit() -> str | None:
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip()
+
+
+def build_report(results: dict) -> dict:
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "created_at": datetime.utcnow().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "benchmarks": results,
+    }
+
+
+def compare(
+    baseline: dict, current: dict, threshold: float = DEFAULT_THRESHOLD
+) -> list[dict]:
+    """Comparar medianas; ``ratio`` > 1 es más lento que el baseline"""
+    rows = []
+    for name, stats in current["benchmarks"].items():
+        base = baseline["benchmarks"].get(name)
+        if base is None:
+            continue
+        ratio = stats["median_us"] / base["median_us"]
+        rows.append(
+            {
+                "name": name,
+                "baseline_us": base["median_us"],
+                "current_us": stats["median_us"],
+                "ratio": ratio,
+                "regression": ratio > threshold,
+            }
+        )
+    return rows
+
+
+def print_results(results: dict):
+    print(f"{'benchmark':<36} {'median us':>12} {'min us':>12} {'ops/s':>12}")
+    for name, stats in results.items():
+        print(
+            f"{name:<36} {stats['median_us']:>12.2f} "
+            f"{stats['min_us']:>12.2f} {stats['ops_per_sec']:>12.0f}"
+        )
+
+
+def print_comparison(rows: list[dict], baseline_meta: dict):
+    print(f"\nvs baseline {baseline_meta.get('commit') or '?'}")
+    print(f"{'benchmark':<36} {'baseline us':>12} {'current us':>12} {'ratio':>7}")
+    for row in rows:
+        flag = "  REGRESION" if row["regression"] else ""
+        print(
+            f"{row['name']:<36} {row['baseline_us']:>12.2f} "
+            f"{row['current_us']:>12.2f} {row['ratio']:>7.2f}{flag}"
+        )
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=DEFAULT_ROUNDS)
+    parser.add_argument(
+        "--scale",
+        type=float,
+        default=1.0,
+        help="multiplicador de iteraciones por ronda",
+    )
+    parser.add_argument("--only", help="prefijo de nombre (p. ej. auth.)")
+    parser.add_argument("--save", help="guardar resultados en este JSON")
+    parser.add_argument("--compare", help="baseline JSON contra el cual comparar")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    args = parser.parse_args()
+
+    results = asyncio.run(run_suite(args.rounds, args.scale, args.only))
+    report = build_report(results)
+    print_results(results)
+
+    if args.save:
+        os.makedirs(os.path.dirname(args.save) or ".", exist_ok=True)
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"\nResultados guardados en {args.save}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        rows = compare(baseline, report, args.threshold)
+        print_comparison(rows, baseline["meta"])
+        if any(row["regression"] for row in rows):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main_cli()
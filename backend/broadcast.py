@@ -0,0 +1,149 @@
+"""Fan-out de mensajes por room con una cola y un worker por room.
+
+El handler que envía el mensaje solo encola (después de guardar en la DB) y
+vuelve; el worker del room hace el emit. Los mensajes de un room salen en
+orden y, si se acumulan, se agrupan en un solo emit ``<event>_batch``.
+
+Cada cola tiene un tamaño máximo: si un room no da abasto, se descartan los
+eventos más viejos y antes del siguiente emit se manda ``messages_dropped``
+(``{"room_id", "dropped"}``) para que el cliente recargue el historial de
+ese room. Los mensajes ya están en la DB; lo que no puede pasar es que el
+backlog crezca sin límite en la memoria del worker.
+"""
+
+import asyncio
+
+# Eventos pendientes por room antes de empezar a descartar los más viejos
+MAX_QUEUE_SIZE = 1000
+# Aviso al room de que se perdieron eventos y hay que recargar el historial
+DROPPED_EVENT = "messages_dropped"
+
+
+class RoomBroadcaster:
+    def __init__(
+        self,
+        sio,
+        max_batch: int = 50,
+        idle_timeout: float = 30.0,
+        max_queue: int = MAX_QUEUE_SIZE,
+    ):
+        self.sio = sio
+        self.max_batch = max_batch
+        self.idle_timeout = idle_timeout
+        self.max_queue = max_queue
+        self._queues: dict[str, asyncio.Queue] = {}
+        self._workers: dict[str, asyncio.Task] = {}
+        # room -> {"room_id", "dropped"} pendiente de avisar
+        self._gaps: dict[str, dict] = {}
+        self.published = 0
+        self.emits = 0
+        self.batched_emits = 0
+        self.dropped = 0
+
+    def publish(self, room: str, event: str, data: dict):
+        """Encolar un evento para el room sin esperar el fan-out"""
+        queue = self._queues.get(room)
+        if queue is None:
+            queue = self._queues[room] = asyncio.Queue(self.max_queue)
+        if queue.full():
+            # Drop-oldest: priorizar los eventos más recientes
+            _, dropped = queue.get_nowait()
+            queue.task_done()
+            self.dropped += 1
+            gap = self._gaps.setdefault(
+                room, {"room_id": dropped.get("room_id"), "dropped": 0}
+            )
+            gap["dropped"] += 1
+            if self.dropped == 1 or self.dropped % 1000 == 0:
+                print(
+                    f"Broadcast: cola de {room} llena, "
+                    f"{self.dropped} eventos descartados en total"
+                )
+        queue.put_nowait((event, data))
+        self.published += 1
+
+        if room not in self._workers:
+            self._workers[room] = asyncio.create_task(
+                self._worker(room, queue), name=f"broadcast:{room}"
+            )
+
+    async def _worker(self, room: str, queue: asyncio.Queue):
+        try:
+            while True:
+                try:
+                    first = await asyncio.wait_for(
+                        queue.get(), timeout=self.idle_timeout
+                    )
+                except TimeoutError:
+                    # Room inactivo: liberar el worker
+                    return
+
+                batch = [first]
+                while len(batch) < self.max_batch and not queue.empty():
+                    batch.append(queue.get_nowait())
+
+                try:
+                    gap = self._gaps.pop(room, None)
+                    if gap is not None:
+                        # Antes del lote: lo descartado es más viejo
+                        self.emits += 1
+                        await self.sio.emit(DROPPED_EVENT, gap, room=room)
+                    await self._emit_batch(room, batch)
+                except Exception as e:
+                    print(f"Error en broadcast a {room}: {e}")
+                finally:
+                    for _ in batch:
+                        queue.task_done()
+        finally:
+            if self._workers.get(room) is asyncio.current_task():
+                del self._workers[room]
+                del self._queues[room]
+                self._gaps.pop(room, None)
+
+    async def _emit_batch(self, room: str, batch: list):
+        # Agrupar eventos consecutivos iguales para no romper el orden
+        groups = []
+        for event, data in batch:
+            if groups and groups[-1][0] == event:
+                groups[-1][1].append(data)
+            else:
+                groups.append((event, [data]))
+
+        for event, items in groups:
+            self.emits += 1
+            if len(items) == 1:
+                await self.sio.emit(event, items[0], room=room)
+            else:
+                self.batched_emits += 1
+                await self.sio.emit(
+                    f"{event}_batch", {"messages": items}, room=room
+                )
+
+    async def drain(self):
+        """Esperar a que todas las colas actuales se vacíen"""
+        await asyncio.gather(*(q.join() for q in list(self._queues.values())))
+
+    async def close(self, timeout: float = 5.0):
+        try:
+            await asyncio.wait_for(self.drain(), timeout=timeout)
+        except TimeoutError:
+            print("Broadcast: cerrando con mensajes pendientes")
+        workers = list(self._workers.values())
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+    def metrics(self) -> dict:
+        depths = {room: q.qsize() for room, q in self._queues.items()}
+        return {
+            "rooms": len(depths),
+            "queue_depth_total": sum(depths.values()),
+            "queue_depth_max": max(depths.values(), default=0),
+            "queue_depths": {
+                room: depth for room, depth in depths.items() if depth
+            },
+            "published": self.published,
+            "emits": self.emits,
+            "batched_emits": self.batched_emits,
+            "dropped": self.dropped,
+        }
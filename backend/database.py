@@ -4,6 +4,9 @@ from sqlalchemy.ext.asyncio import (
     async_sessionmaker,
 )
 import os
+import time
+from typing import Optional
+from sqlalchemy import inspect, text
 from models import Base
 
 DATABASE_URL = os.getenv(
@@ -13,15 +16,187 @@ ASYNC_DATABASE_URL = DATABASE_URL.replace(
     "postgresql://", "postgresql+asyncpg://"
 )
 
+# Réplica de lectura opcional para historial y lista de DMs
+DATABASE_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL")
+
+# Segundos que un usuario lee del primario después de escribir
+READ_YOUR_WRITES_WINDOW = float(os.getenv("READ_YOUR_WRITES_WINDOW", "5"))
+
+# auto: create_all solo si la DB no está versionada por Alembic
+# create: create_all siempre (comportamiento anterior)
+# skip: no tocar el schema
+DB_SCHEMA_MODE = os.getenv("DB_SCHEMA_MODE", "auto")
+
+# Advisory lock para que varios workers no hagan DDL a la vez
+SCHEMA_LOCK_KEY = 727_002
+
+ALEMBIC_INI = os.path.join(os.path.dirname(__file__), "alembic.ini")
+# Revisión equivalente al schema que creaba create_all antes de Alembic
+LEGACY_SCHEMA_REVISION = "0001"
+
 engine = create_async_engine(ASYNC_DATABASE_URL)
 AsyncSessionLocal = async_sessionmaker(
     engine, class_=AsyncSession, expire_on_commit=False
 )
 
+replica_engine = None
+if DATABASE_REPLICA_URL:
+    replica_engine = create_async_engine(
+        DATABASE_REPLICA_URL.replace(
+            "postgresql://", "postgresql+asyncpg://"
+        ),
+        execution_options={"postgresql_readonly": True},
+    )
+
+# Sin réplica, las lecturas van al primario
+ReadSessionLocal = async_sessionmaker(
+    replica_engine or engine, class_=AsyncSession, expire_on_commit=False
+)
+
+# user_id -> time.monotonic() hasta el que se lee del primario
+_primary_pins: dict[int, float] = {}
+
+
+def mark_user_write(user_id: int):
+    """Fijar al usuario al primario un rato para leer sus propias escrituras.
+
+    El pin es por worker: con varios workers conviene sticky sessions.
+    """
+    if replica_engine is None:
+        return
+    now = time.monotonic()
+    if len(_primary_pins) > 10000:
+        for uid in [u for u, until in _primary_pins.items() if until < now]:
+            del _primary_pins[uid]
+    _primary_pins[user_id] = now + READ_YOUR_WRITES_WINDOW
+
+
+def read_session_factory(user_id: Optional[int] = None):
+    """Elegir réplica o primario para las lecturas de un usuario"""
+    if replica_engine is None:
+        return AsyncSessionLocal
+    if user_id is not None:
+        until = _primary_pins.get(user_id)
+        if until is not None:
+            if until > time.monotonic():
+                return AsyncSessionLocal
+            del _primary_pins[user_id]
+    return ReadSessionLocal
+
+
+def pool_metrics() -> dict:
+    engines = {"primary": engine}
+    if replica_engine is not None:
+        engines["replica"] = replica_engine
+
+    metrics = {}
+    for name, eng in engines.items():
+        pool = eng.pool
+        stats = {"pool": type(pool).__name__, "status": pool.status()}
+        # Solo QueuePool (el default de Postgres) expone contadores
+        for attr in ("size", "checkedin", "checkedout", "overflow"):
+            if hasattr(pool, attr):
+                stats[attr] = getattr(pool, attr)()
+        metrics[name] = stats
+    metrics["pinned_users"] = len(_primary_pins)
+    return metrics
+
+
+def _schema_version(sync_conn) -> Optional[str]:
+    if not inspect(sync_conn).has_table("alembic_version"):
+        return None
+    return sync_conn.execute(
+        text("SELECT version_num FROM alembic_version")
+    ).scalar()
+
+
+async def get_schema_version() -> Optional[str]:
+    """Versión de Alembic de la DB, o None si no está versionada"""
+    async with engine.connect() as conn:
+        return await conn.run_sync(_schema_version)
+
+
+def _alembic_config(sync_conn=None):
+    # Import tardío: Alembic solo hace falta si hay que tocar el schema
+    from alembic.config import Config
+
+    config = Config(ALEMBIC_INI)
+    if sync_conn is not None:
+        config.attributes["connection"] = sync_conn
+    return config
+
+
+def _needs_upgrade(version: str) -> bool:
+    """La DB está en una revisión conocida anterior a head"""
+    from alembic.script import ScriptDirectory
+    from alembic.util import CommandError
+
+    script = ScriptDirectory.from_config(_alembic_config())
+    if version == script.get_current_head():
+        return False
+    try:
+        script.get_revision(version)
+    except CommandError:
+        # Revisión de un deploy más nuevo: no tocar el schema
+        print(f"Schema en revisión desconocida {version}, no se migra")
+        return False
+    return True
+
+
+def _version_schema(sync_conn) -> Optional[str]:
+    """Llevar la DB a head: versionarla si no tiene versión o migrarla"""
+    from alembic import command
+
+    config = _alembic_config(sync_conn)
+    version = _schema_version(sync_conn)
+    if version:
+        # Otro worker pudo haberla migrado mientras esperábamos el lock
+        if _needs_upgrade(version):
+            print(f"Migrando schema de {version} a head")
+            command.upgrade(config, "head")
+        return _schema_version(sync_conn)
+
+    inspector = inspect(sync_conn)
+    legacy = inspector.has_table("rooms") and "member_count" not in {
+        column["name"] for column in inspector.get_columns("rooms")
+    }
+    if legacy:
+        # Schema anterior a las migraciones: aplicar solo lo que falta
+        command.stamp(config, LEGACY_SCHEMA_REVISION)
+        command.upgrade(config, "head")
+    else:
+        Base.metadata.create_all(sync_conn)
+        command.stamp(config, "head")
+    return _schema_version(sync_conn)
+
+
+async def init_db() -> Optional[str]:
+    """Preparar el schema al arrancar.
+
+    Con DB_SCHEMA_MODE=auto se consulta una vez la tabla de Alembic: si la
+    DB ya está en head, el schema lo gestionan las migraciones y no se
+    ejecuta create_all (evita locks de DDL en cada arranque). Una DB en
+    una revisión anterior se migra a head; una sin versión se crea (o, si
+    viene de create_all sin migraciones, se migra) y se marca con head.
+    """
+    if DB_SCHEMA_MODE == "skip":
+        return None
+
+    if DB_SCHEMA_MODE == "auto":
+        version = await get_schema_version()
+        if version and not _needs_upgrade(version):
+            return version
 
-async def init_db():
     async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+        if conn.dialect.name == "postgresql":
+            await conn.execute(
+                text("SELECT pg_advisory_xact_lock(:key)"),
+                {"key": SCHEMA_LOCK_KEY},
+            )
+        if DB_SCHEMA_MODE == "create":
+            await conn.run_sync(Base.metadata.create_all)
+            return None
+        return await conn.run_sync(_version_schema)
 
 
 async def get_db():
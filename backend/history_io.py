@@ -0,0 +1,321 @@
+"""Export e import masivo del historial de mensajes.
+
+El export hace streaming (NDJSON o CSV) con memoria constante: en Postgres
+el CSV sale directo de ``COPY ... TO STDOUT`` y el resto usa un cursor del
+lado del servidor. El import carga por lotes con ``COPY FROM``
+(``copy_records_to_table`` de asyncpg) y recalcula los contadores de los
+rooms tocados.
+
+CLI:
+
+    python history_io.py export --room-id 1 --format csv > room1.csv
+    python history_io.py import --format ndjson < messages.ndjson
+"""
+
+import argparse
+import asyncio
+import csv
+import io
+import json
+import sys
+from collections.abc import AsyncIterator, Iterable
+from datetime import datetime
+from typing import Optional
+
+import asyncpg
+from sqlalchemy import case, func, insert, or_, select, update
+from sqlalchemy.exc import DataError, IntegrityError
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from models import Message, Room
+
+EXPORT_COLUMNS = (
+    "id",
+    "room_id",
+    "sender_id",
+    "content",
+    "message_type",
+    "created_at",
+)
+IMPORT_COLUMNS = (
+    "room_id",
+    "sender_id",
+    "content",
+    "message_type",
+    "created_at",
+)
+EXPORT_FORMATS = ("ndjson", "csv")
+BATCH_SIZE = 5000
+
+# Errores de un import por datos inválidos (no del servidor). El COPY de
+# asyncpg no pasa por SQLAlchemy y levanta las excepciones del driver.
+IMPORT_ERRORS = (
+    ValueError,
+    KeyError,
+    TypeError,
+    IntegrityError,
+    DataError,
+    asyncpg.IntegrityConstraintViolationError,
+    asyncpg.DataError,
+)
+
+
+def export_query(room_id: Optional[int] = None, user_id: Optional[int] = None):
+    query = select(*(Message.__table__.c[name] for name in EXPORT_COLUMNS))
+    if room_id is not None:
+        query = query.where(Message.room_id == room_id)
+    if user_id is not None:
+        query = query.where(Message.sender_id == user_id)
+    return query.order_by(Message.id)
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Cannot serialize {type(value)}")
+
+
+async def _stream_rows(conn: AsyncConnection, query, batch_size: int):
+    result = await conn.stream(query.execution_options(yield_per=batch_size))
+    async for partition in result.partitions():
+        yield partition
+
+
+async def stream_ndjson(
+    conn: AsyncConnection, query, batch_size: int = BATCH_SIZE
+) -> AsyncIterator[bytes]:
+    async for rows in _stream_rows(conn, query, batch_size):
+        yield "".join(
+            json.dumps(dict(row._mapping), default=_json_default) + "\n"
+            for row in rows
+        ).encode()
+
+
+async def stream_csv(
+    conn: AsyncConnection, query, batch_size: int = BATCH_SIZE
+) -> AsyncIterator[bytes]:
+    if conn.dialect.name == "postgresql":
+        async for chunk in _copy_to_csv(conn, query):
+            yield chunk
+        return
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(EXPORT_COLUMNS)
+    async for rows in _stream_rows(conn, query, batch_size):
+        writer.writerows(
+            [
+                value.isoformat() if isinstance(value, datetime) else value
+                for value in row
+            ]
+            for row in rows
+        )
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+async def _copy_to_csv(conn: AsyncConnection, query) -> AsyncIterator[bytes]:
+    """``COPY (query) TO STDOUT`` con backpressure vía una cola acotada"""
+    compiled = query.compile(
+        dialect=conn.dialect, compile_kwargs={"literal_binds": True}
+    )
+    raw = await conn.get_raw_connection()
+    driver_conn = raw.driver_connection
+    chunks: asyncio.Queue = asyncio.Queue(maxsize=16)
+
+    async def on_chunk(chunk: bytes):
+        await chunks.put(chunk)
+
+    async def run_copy():
+        try:
+            await driver_conn.copy_from_query(
+                str(compiled), output=on_chunk, format="csv", header=True
+            )
+        finally:
+            await chunks.put(None)
+
+    task = asyncio.create_task(run_copy())
+    try:
+        while (chunk := await chunks.get()) is not None:
+            yield chunk
+        await task
+    finally:
+        task.cancel()
+
+
+def _parse_record(data: dict) -> tuple:
+    if not isinstance(data, dict):
+        raise TypeError(f"expected an object, got {type(data).__name__}")
+    if not isinstance(data["content"], str):
+        raise TypeError("content must be a string")
+    created_at = data.get("created_at")
+    if isinstance(created_at, str) and created_at:
+        created_at = datetime.fromisoformat(created_at)
+    return (
+        int(data["room_id"]),
+        int(data["sender_id"]),
+        data["content"],
+        data.get("message_type") or "text",
+        created_at or datetime.utcnow(),
+    )
+
+
+async def iter_lines(chunks) -> AsyncIterator[str]:
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line.decode()
+    if buffer:
+        yield buffer.decode()
+
+
+async def iter_ndjson_records(chunks) -> AsyncIterator[tuple]:
+    async for line in iter_lines(chunks):
+        if line.strip():
+            yield _parse_record(json.loads(line))
+
+
+async def iter_csv_records(chunks) -> AsyncIterator[tuple]:
+    header = None
+    pending = ""
+    async for line in iter_lines(chunks):
+        pending += line if not pending else "\n" + line
+        # Comillas impares: el campo sigue en la próxima línea
+        if pending.count('"') % 2:
+            continue
+        if pending.strip():
+            row = next(csv.reader([pending]))
+            if header is None:
+                header = row
+            else:
+                yield _parse_record(dict(zip(header, row, strict=False)))
+        pending = ""
+
+
+async def _aiter(items: Iterable):
+    for item in items:
+        yield item
+
+
+async def import_messages(
+    conn: AsyncConnection, records, batch_size: int = BATCH_SIZE
+) -> int:
+    """Cargar mensajes por lotes; ``records`` son tuplas de IMPORT_COLUMNS"""
+    if not hasattr(records, "__aiter__"):
+        records = _aiter(records)
+
+    total = 0
+    room_ids = set()
+    batch = []
+
+    async def flush():
+        nonlocal total
+        if conn.dialect.name == "postgresql":
+            if not total:
+                # El adaptador de asyncpg emite el BEGIN en el primer
+                # execute; sin esto el COPY quedaría fuera de la transacción
+                await conn.execute(select(1))
+            raw = await conn.get_raw_connection()
+            await raw.driver_connection.copy_records_to_table(
+                Message.__tablename__, records=batch, columns=IMPORT_COLUMNS
+            )
+        else:
+            await conn.execute(
+                insert(Message.__table__),
+                [dict(zip(IMPORT_COLUMNS, r, strict=True)) for r in batch],
+            )
+        total += len(batch)
+        batch.clear()
+
+    async for record in records:
+        batch.append(record)
+        room_ids.add(record[0])
+        if len(batch) >= batch_size:
+            await flush()
+    if batch:
+        await flush()
+
+    if room_ids:
+        await refresh_room_counters(conn, room_ids)
+    return total
+
+
+async def refresh_room_counters(conn: AsyncConnection, room_ids: set):
+    """Recalcular message_count y last_activity_at después de un import"""
+    stats = (
+        select(
+            Message.room_id,
+            func.count().label("message_count"),
+            func.max(Message.created_at).label("last_message_at"),
+        )
+        .where(Message.room_id.in_(room_ids))
+        .group_by(Message.room_id)
+    )
+    for room_id, message_count, last_message_at in (
+        await conn.execute(stats)
+    ).all():
+        await conn.execute(
+            update(Room)
+            .where(Room.id == room_id)
+            .values(
+                message_count=message_count,
+                last_activity_at=case(
+                    (
+                        or_(
+                            Room.last_activity_at.is_(None),
+                            Room.last_activity_at < last_message_at,
+                        ),
+                        last_message_at,
+                    ),
+                    else_=Room.last_activity_at,
+                ),
+            )
+        )
+
+
+async def _stdin_chunks():
+    loop = asyncio.get_running_loop()
+    while chunk := await loop.run_in_executor(
+        None, sys.stdin.buffer.read, 1 << 16
+    ):
+        yield chunk
+
+
+async def run_cli(args, engine: AsyncEngine):
+    if args.command == "export":
+        query = export_query(args.room_id, args.user_id)
+        stream = stream_csv if args.format == "csv" else stream_ndjson
+        async with engine.connect() as conn:
+            async for chunk in stream(conn, query):
+                sys.stdout.buffer.write(chunk)
+        sys.stdout.buffer.flush()
+    else:
+        parse = (
+            iter_csv_records if args.format == "csv" else iter_ndjson_records
+        )
+        async with engine.begin() as conn:
+            total = await import_messages(conn, parse(_stdin_chunks()))
+        print(f"{total} mensajes importados", file=sys.stderr)
+    await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export/import de mensajes")
+    parser.add_argument("command", choices=("export", "import"))
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="ndjson")
+    parser.add_argument("--room-id", type=int)
+    parser.add_argument("--user-id", type=int)
+    args = parser.parse_args()
+
+    from database import engine
+
+    asyncio.run(run_cli(args, engine))
+
+
+if __name__ == "__main__":
+    main()
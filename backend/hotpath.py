@@ -0,0 +1,251 @@
+"""Acceso a datos de los paths calientes con SQLAlchemy Core.
+
+``send_message``, el historial de un room y la lista de DMs solo necesitan
+unas pocas columnas: con statements Core no se crean instancias ORM (ni
+identity map ni instrumentación de relaciones) y los resultados se copian a
+dataclasses con ``__slots__``.
+"""
+
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import and_, func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import Message, Room, RoomMembership, User
+
+messages = Message.__table__
+rooms = Room.__table__
+memberships = RoomMembership.__table__
+users = User.__table__
+
+
+@dataclass(slots=True)
+class SocketSession:
+    """Entrada de ``connected_users`` para un socket autenticado"""
+
+    user_id: int
+    username: str
+    status: str
+    sid: str
+
+
+@dataclass(slots=True)
+class MessageRow:
+    id: int
+    room_id: int
+    sender_id: int
+    content: str
+    created_at: datetime
+
+    def as_event(self, username: str) -> dict:
+        return {
+            'id': self.id,
+            'message': self.content,
+            'username': username,
+            'room_id': self.room_id,
+            'timestamp': self.created_at.isoformat(),
+        }
+
+
+@dataclass(slots=True)
+class HistoryRow:
+    id: int
+    content: str
+    room_id: int
+    created_at: datetime
+    sender_id: int
+    username: str
+
+    def as_dict(self) -> dict:
+        return {
+            'id': self.id,
+            'message': self.content,
+            'username': self.username,
+            'sender_id': self.sender_id,
+            'room_id': self.room_id,
+            'timestamp': self.created_at.isoformat(),
+        }
+
+
+@dataclass(slots=True)
+class DMSummary:
+    id: int
+    name: str
+    with_user_id: int
+    with_user: str
+    last_message: Optional[str]
+    last_message_time: Optional[datetime]
+    unread_count: int
+
+    def as_dict(self) -> dict:
+        return {
+            'id': self.id,
+            'name': self.name,
+            'type': 'dm',
+            'with_user': self.with_user,
+            'with_user_id': self.with_user_id,
+            'last_message': self.last_message,
+            'last_message_time': (
+                self.last_message_time.isoformat()
+                if self.last_message_time else None
+            ),
+            'unread_count': self.unread_count,
+        }
+
+
+async def insert_message(
+    db: AsyncSession, sender_id: int, room_id: int, content: str
+) -> MessageRow:
+    """INSERT ... RETURNING del mensaje + contadores del room (sin commit)"""
+    created_at = datetime.utcnow()
+    result = await db.execute(
+        insert(messages)
+        .values(
+            content=content,
+            sender_id=sender_id,
+            room_id=room_id,
+            created_at=created_at,
+        )
+        .returning(messages.c.id)
+    )
+    message_id = result.scalar_one()
+
+    await db.execute(
+        update(rooms)
+        .where(rooms.c.id == room_id)
+        .values(
+            message_count=rooms.c.message_count + 1,
+            last_activity_at=created_at,
+        )
+    )
+    return MessageRow(message_id, room_id, sender_id, content, created_at)
+
+
+async def is_room_member(db: AsyncSession, room_id: int, user_id: int) -> bool:
+    result = await db.execute(
+        select(memberships.c.id)
+        .where(
+            memberships.c.room_id == room_id,
+            memberships.c.user_id == user_id,
+        )
+        .limit(1)
+    )
+    return result.first() is not None
+
+
+async def fetch_room_history(
+    db: AsyncSession, room_id: int, limit: int
+) -> list[HistoryRow]:
+    """Últimos ``limit`` mensajes del room, del más viejo al más nuevo"""
+    result = await db.execute(
+        select(
+            messages.c.id,
+            messages.c.content,
+            messages.c.room_id,
+            messages.c.created_at,
+            users.c.id,
+            users.c.username,
+        )
+        .join(users, messages.c.sender_id == users.c.id)
+        .where(messages.c.room_id == room_id)
+        .order_by(messages.c.created_at.desc())
+        .limit(limit)
+    )
+    history = [HistoryRow(*row) for row in result]
+    history.reverse()
+    return history
+
+
+async def fetch_user_dms(db: AsyncSession, user_id: int) -> list[DMSummary]:
+    """DMs del usuario con cantidad fija de queries"""
+    result = await db.execute(
+        select(rooms.c.id, rooms.c.name)
+        .join(memberships, memberships.c.room_id == rooms.c.id)
+        .where(
+            rooms.c.room_type == 'dm',
+            memberships.c.user_id == user_id,
+        )
+    )
+    dm_rooms = result.all()
+    if not dm_rooms:
+        return []
+    room_ids = [room_id for room_id, _ in dm_rooms]
+
+    other_members = await db.execute(
+        select(memberships.c.room_id, users.c.id, users.c.username)
+        .join(users, users.c.id == memberships.c.user_id)
+        .where(
+            memberships.c.room_id.in_(room_ids),
+            memberships.c.user_id != user_id,
+        )
+    )
+    other_users = {}
+    for room_id, other_id, other_username in other_members:
+        other_users.setdefault(room_id, (other_id, other_username))
+
+    # Último por created_at, no por id: los mensajes importados traen la
+    # fecha del sistema de origen con ids más nuevos
+    ranked = (
+        select(
+            messages.c.room_id,
+            messages.c.content,
+            messages.c.created_at,
+            func.row_number()
+            .over(
+                partition_by=messages.c.room_id,
+                order_by=(messages.c.created_at.desc(), messages.c.id.desc()),
+            )
+            .label("position"),
+        )
+        .where(messages.c.room_id.in_(room_ids))
+        .subquery()
+    )
+    last_msgs = await db.execute(
+        select(ranked.c.room_id, ranked.c.content, ranked.c.created_at).where(
+            ranked.c.position == 1
+        )
+    )
+    last_messages = {
+        room_id: (content, created_at)
+        for room_id, content, created_at in last_msgs
+    }
+
+    # Mensajes después de last_read_at, sin contar los propios
+    unread_counts = await db.execute(
+        select(messages.c.room_id, func.count())
+        .join(
+            memberships,
+            and_(
+                memberships.c.room_id == messages.c.room_id,
+                memberships.c.user_id == user_id,
+            ),
+        )
+        .where(
+            messages.c.room_id.in_(room_ids),
+            messages.c.created_at > memberships.c.last_read_at,
+            messages.c.sender_id != user_id,
+        )
+        .group_by(messages.c.room_id)
+    )
+    unread = dict(unread_counts.all())
+
+    dms = []
+    for room_id, name in dm_rooms:
+        other_user = other_users.get(room_id)
+        if not other_user:
+            continue
+        last_content, last_time = last_messages.get(room_id, (None, None))
+        dms.append(
+            DMSummary(
+                room_id,
+                name,
+                other_user[0],
+                other_user[1],
+                last_content,
+                last_time,
+                unread.get(room_id, 0),
+            )
+        )
+    return dms
@@ -1,16 +1,37 @@
-from select import select
+# El timestamp de arranque va antes de los imports para medir cuánto
+# tardan (startup_timings["imports"]), así que E402 no aplica a este módulo
+# ruff: noqa: E402
+import time
 
-from fastapi import FastAPI, Depends, HTTPException, status
+_startup_t0 = time.perf_counter()
+
+from fastapi import FastAPI, Depends, HTTPException, Request, status
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer
 from sqlalchemy.ext.asyncio import AsyncSession
 from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
+import base64
+import json
+import os
 import socketio
-import uvicorn
+from typing import Optional
+from sqlalchemy import and_, or_, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.future import select
 
-from database import init_db, get_db, AsyncSessionLocal
+from database import (
+    init_db,
+    get_db,
+    AsyncSessionLocal,
+    engine,
+    mark_user_write,
+    pool_metrics,
+    read_session_factory,
+    replica_engine,
+)
 from auth import (
     create_user,
     authenticate_user,
@@ -18,46 +39,249 @@ from auth import (
     verify_token,
     get_user_by_id,
     get_user_by_email,
+    create_refresh_token,
+    rotate_refresh_token,
+    revoke_refresh_token,
+    purge_expired_refresh_tokens,
+    ACCESS_TOKEN_EXPIRE_MINUTES,
+)
+from broadcast import RoomBroadcaster
+from cache import TTLCache
+from hotpath import (
+    SocketSession,
+    fetch_room_history,
+    fetch_user_dms,
+    insert_message,
+    is_room_member,
 )
-from models import User, Room, Message, RoomMembership
-from schemas.user import UserRegister, UserLogin
+from models import User, Room, RoomMembership
+from profiling import (
+    QUERY_PROFILING,
+    QueryProfiler,
+    QueryProfilingMiddleware,
+)
+from scheduler import Scheduler
+from schemas.user import UserRegister, UserLogin, TokenRefresh
 
 security = HTTPBearer()
 
 
+DEFAULT_ROOMS = [
+    {
+        "id": 1,
+        "name": "General",
+        "description": "General chat room",
+        "is_private": False,
+        "room_type": "public",
+    },
+]
+
+
 async def create_default_rooms():
-    """Crear rooms por defecto si no existen"""
+    """Crear rooms por defecto si no existen (INSERT ... ON CONFLICT)"""
     async with AsyncSessionLocal() as db:
-        try:
-            # Intentar crear room general directamente
-            room1 = Room(
-                id=1,
-                name="General",
-                description="General chat room",
-                is_private=False,
-                room_type="public"
+        if db.bind.dialect.name == "postgresql":
+            insert = pg_insert
+        else:
+            insert = sqlite_insert
+
+        result = await db.execute(
+            insert(Room)
+            .values(DEFAULT_ROOMS)
+            .on_conflict_do_nothing(index_elements=[Room.id])
+        )
+        await db.commit()
+        return result.rowcount
+
+
+# Intervalos de los jobs de mantenimiento (segundos)
+LAST_SEEN_FLUSH_INTERVAL = 60
+PRESENCE_CLEANUP_INTERVAL = 120
+TYPING_EXPIRY_INTERVAL = 5
+TYPING_TIMEOUT = 10
+ROOM_DIRECTORY_TTL = 10
+
+# Límites de conexiones por worker
+MAX_CONNECTIONS = int(os.getenv("MAX_CONNECTIONS", "10000"))
+MAX_CONNECTIONS_PER_IP = int(os.getenv("MAX_CONNECTIONS_PER_IP", "50"))
+UNAUTHENTICATED_TIMEOUT = float(os.getenv("UNAUTHENTICATED_TIMEOUT", "10"))
+# Si es False, se aceptan sockets sin token que luego usan `authenticate`
+REQUIRE_HANDSHAKE_AUTH = os.getenv(
+    "REQUIRE_HANDSHAKE_AUTH", "false"
+).lower() in ("1", "true", "yes")
+
+# Usuarios con acceso a /admin (ids separados por coma)
+ADMIN_USER_IDS = {
+    int(user_id)
+    for user_id in os.getenv("ADMIN_USER_IDS", "").split(",")
+    if user_id.strip()
+}
+
+scheduler = Scheduler(engine)
+
+
+async def flush_last_seen():
+    """Actualizar last_seen de los usuarios conectados a este worker"""
+    user_ids = {u.user_id for u in connected_users.values()}
+    if not user_ids:
+        return
+
+    async with AsyncSessionLocal() as db:
+        await db.execute(
+            update(User)
+            .where(User.id.in_(user_ids))
+            .values(last_seen=datetime.utcnow(), is_online=True)
+        )
+        await db.commit()
+
+
+async def cleanup_stale_presence():
+    """Marcar offline a usuarios de sockets/workers caídos.
+
+    Un usuario conectado refresca last_seen cada LAST_SEEN_FLUSH_INTERVAL;
+    si lleva varios intervalos sin refrescar, su socket ya no existe.
+    """
+    cutoff = datetime.utcnow() - timedelta(
+        seconds=LAST_SEEN_FLUSH_INTERVAL * 3
+    )
+    async with AsyncSessionLocal() as db:
+        await db.execute(
+            update(User)
+            .where(User.is_online.is_(True), User.last_seen < cutoff)
+            .values(is_online=False)
+        )
+        await db.commit()
+
+
+async def expire_typing():
+    """Emitir typing_stop para indicadores que nunca recibieron stop"""
+    cutoff = time.monotonic() - TYPING_TIMEOUT
+    for (sid, room_id), started_at in list(typing_users.items()):
+        if started_at > cutoff:
+            continue
+        del typing_users[(sid, room_id)]
+        user_data = connected_users.get(sid)
+        if not user_data:
+            continue
+        await sio.emit(
+            "typing_stop",
+            {"username": user_data.username, "room_id": room_id},
+            room=f"room_{room_id}",
+            skip_sid=sid,
+        )
+
+
+async def expire_unauthenticated():
+    """Desconectar sockets que no se autenticaron a tiempo"""
+    cutoff = time.monotonic() - UNAUTHENTICATED_TIMEOUT
+    for sid, connected_at in list(unauthenticated_sockets.items()):
+        if connected_at > cutoff:
+            continue
+        unauthenticated_sockets.pop(sid, None)
+        connection_stats["unauthenticated_timeouts"] += 1
+        await sio.disconnect(sid)
+
+
+async def cleanup_refresh_tokens():
+    """Borrar refresh tokens vencidos"""
+    async with AsyncSessionLocal() as db:
+        await purge_expired_refresh_tokens(db)
+
+
+async def warm_room_directory():
+    """Precalentar la primera página del directorio de rooms"""
+    async with AsyncSessionLocal() as db:
+        for sort in ROOM_SORTS:
+            room_directory_cache.set(
+                (None, sort, ROOM_DIRECTORY_PAGE_SIZE, None),
+                await fetch_room_directory(
+                    db, None, sort, ROOM_DIRECTORY_PAGE_SIZE, None
+                ),
             )
-            db.add(room1)
-            await db.commit()
-            print("Room 'General' creada")
-        except Exception as e:
-            # Si ya existe, hacer rollback
-            await db.rollback()
-            print(f"Room ya existe o error: {e}")
+
+
+scheduler.add_job(
+    "flush_last_seen",
+    flush_last_seen,
+    LAST_SEEN_FLUSH_INTERVAL,
+    timeout=10,
+)
+scheduler.add_job(
+    "cleanup_stale_presence",
+    cleanup_stale_presence,
+    PRESENCE_CLEANUP_INTERVAL,
+    timeout=30,
+    singleton=True,
+)
+scheduler.add_job(
+    "expire_typing",
+    expire_typing,
+    TYPING_EXPIRY_INTERVAL,
+    jitter=0.2,
+    timeout=5,
+)
+scheduler.add_job(
+    "expire_unauthenticated",
+    expire_unauthenticated,
+    UNAUTHENTICATED_TIMEOUT / 2,
+    jitter=0.2,
+    timeout=5,
+)
+scheduler.add_job(
+    "cleanup_refresh_tokens",
+    cleanup_refresh_tokens,
+    3600,
+    timeout=60,
+    singleton=True,
+)
+scheduler.add_job(
+    "warm_room_directory",
+    warm_room_directory,
+    ROOM_DIRECTORY_TTL,
+    jitter=0.2,
+    timeout=5,
+)
+
+
+# Tiempos de arranque en ms (imports, init_db, rooms, scheduler, total)
+startup_timings = {}
+
 
 # Lifespan para inicializar DB
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     print("Iniciando aplicación...")
-    await init_db()
-    print("Base de datos inicializada")
-    await create_default_rooms()
-    print("Rooms inicializados")
+    t0 = time.perf_counter()
+    startup_timings["imports"] = (t0 - _startup_t0) * 1000
+
+    version = await init_db()
+    t1 = time.perf_counter()
+    startup_timings["init_db"] = (t1 - t0) * 1000
+    if version:
+        print(f"Schema en versión {version}, create_all omitido")
+    else:
+        print("Base de datos inicializada")
+
+    created = await create_default_rooms()
+    t2 = time.perf_counter()
+    startup_timings["default_rooms"] = (t2 - t1) * 1000
+    print(f"Rooms inicializados ({created} nuevos)")
+
+    await scheduler.start()
+    t3 = time.perf_counter()
+    startup_timings["scheduler"] = (t3 - t2) * 1000
+    startup_timings["total"] = (t3 - _startup_t0) * 1000
+    print(f"Arranque completado en {startup_timings['total']:.0f} ms")
     yield
     print("Cerrando aplicación...")
+    await scheduler.stop()
+    await broadcaster.close()
 
 sio = socketio.AsyncServer(async_mode="asgi", cors_allowed_origins="*")
 
+# Fan-out de mensajes fuera del handler que los envía
+broadcaster = RoomBroadcaster(sio)
+
 app = FastAPI(
     title="Realtime Chat API",
     description="Real-time chat with auth and persistence",
@@ -73,11 +297,97 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Profiling de queries (QUERY_PROFILING=1)
+profiler = QueryProfiler()
+if QUERY_PROFILING:
+    profiler.attach(engine)
+    if replica_engine is not None:
+        profiler.attach(replica_engine)
+    app.add_middleware(QueryProfilingMiddleware, profiler=profiler)
+
 socket_app = socketio.ASGIApp(sio, app)
 
 # Store para usuarios conectados
 connected_users = {}
 
+# Indicadores de typing activos: (sid, room_id) -> time.monotonic()
+typing_users = {}
+
+socket_ips = {}  # sid -> ip
+connections_by_ip = {}  # ip -> sockets abiertos
+unauthenticated_sockets = {}  # sid -> time.monotonic() al conectar
+connection_stats = {
+    "refused_capacity": 0,
+    "refused_ip": 0,
+    "refused_auth": 0,
+    "unauthenticated_timeouts": 0,
+}
+
+
+def socket_room_name(room_id: int, room_type: str) -> str:
+    """Nombre del room de Socket.IO para un Room de la DB"""
+    if room_type == "dm":
+        return f"dm_{room_id}"
+    return f"room_{room_id}"
+
+
+async def join_user_rooms(sid: str, user_id: int) -> list[int]:
+    """Suscribir un socket a todos los rooms del usuario con una sola query.
+
+    No emite ``user_joined_room`` por cada room: en un reconnect el cliente
+    recibe la lista en ``authenticated`` y el resto de usuarios solo ve el
+    cambio de presencia.
+    """
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(Room.id, Room.room_type)
+            .join(RoomMembership, RoomMembership.room_id == Room.id)
+            .where(RoomMembership.user_id == user_id)
+        )
+        rooms = result.all()
+
+    for room_id, room_type in rooms:
+        await sio.enter_room(sid, socket_room_name(room_id, room_type))
+
+    return [room_id for room_id, _ in rooms]
+
+
+async def add_room_members(
+    db: AsyncSession, room_id: int, user_ids: list
+) -> list[int]:
+    """Agregar miembros y mantener Room.member_count en la misma transacción.
+
+    Idempotente aun con joins concurrentes: el unique de
+    ``(room_id, user_id)`` descarta los que ya son miembros y solo se
+    cuentan las filas insertadas. Devuelve los user_ids agregados.
+    """
+    if db.bind.dialect.name == "postgresql":
+        insert = pg_insert
+    else:
+        insert = sqlite_insert
+
+    result = await db.execute(
+        insert(RoomMembership)
+        .values(
+            [
+                {"room_id": room_id, "user_id": user_id}
+                for user_id in dict.fromkeys(user_ids)
+            ]
+        )
+        .on_conflict_do_nothing(
+            index_elements=[RoomMembership.room_id, RoomMembership.user_id]
+        )
+        .returning(RoomMembership.user_id)
+    )
+    new_ids = list(result.scalars())
+    if new_ids:
+        await db.execute(
+            update(Room)
+            .where(Room.id == room_id)
+            .values(member_count=Room.member_count + len(new_ids))
+        )
+    return new_ids
+
 
 # Auth dependency para WebSockets
 async def get_current_user_ws(token: str):
@@ -93,6 +403,15 @@ async def get_current_user_ws(token: str):
         return await get_user_by_id(db, int(user_id))
 
 
+async def get_read_db(credentials=Depends(security)):
+    """Sesión de lectura: réplica, salvo que el usuario haya escrito recién"""
+    payload = verify_token(credentials.credentials)
+    user_id = payload.get("sub") if payload else None
+    session_factory = read_session_factory(int(user_id) if user_id else None)
+    async with session_factory() as session:
+        yield session
+
+
 # REST Endpoints
 @app.post("/auth/register")
 async def register(
@@ -115,29 +434,77 @@ async def login(user_data: UserLogin, db: AsyncSession = Depends(get_db)):
     if not user:
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
-    access_token_expires = timedelta(minutes=30)
+    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
         data={"sub": str(user.id)}, expires_delta=access_token_expires
     )
+    user_info = {
+        "id": user.id,
+        "username": user.username,
+        "email": user.email,
+    }
+    refresh_token = await create_refresh_token(db, user.id)
 
     return {
         "access_token": access_token,
+        "refresh_token": refresh_token,
         "token_type": "bearer",
-        "user": {
-            "id": user.id,
-            "username": user.username,
-            "email": user.email,
-        },
+        "user": user_info,
     }
 
 
+@app.post("/auth/refresh")
+async def refresh(data: TokenRefresh, db: AsyncSession = Depends(get_db)):
+    """Rotate a refresh token without re-verifying the password"""
+    rotated = await rotate_refresh_token(db, data.refresh_token)
+    if not rotated:
+        raise HTTPException(status_code=401, detail="Invalid refresh token")
+
+    user_id, refresh_token = rotated
+    access_token = create_access_token(
+        data={"sub": str(user_id)},
+        expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES),
+    )
+    return {
+        "access_token": access_token,
+        "refresh_token": refresh_token,
+        "token_type": "bearer",
+    }
+
+
+@app.post("/auth/logout")
+async def logout(data: TokenRefresh, db: AsyncSession = Depends(get_db)):
+    await revoke_refresh_token(db, data.refresh_token)
+    return {"message": "Logged out"}
+
+
 @app.get("/")
 def read_root():
     return {"message": "Realtime Chat API with Auth is running!"}
 
 
+@app.get("/metrics")
+def get_metrics():
+    """Métricas internas del worker"""
+    return {
+        "startup_ms": startup_timings,
+        "jobs": scheduler.metrics(),
+        "broadcast": broadcaster.metrics(),
+        "room_directory_cache": room_directory_cache.metrics(),
+        "db_pools": pool_metrics(),
+        "queries": profiler.report(),
+        "connections": {
+            "open": len(socket_ips),
+            "authenticated": len(connected_users),
+            "unauthenticated": len(unauthenticated_sockets),
+            "ips": len(connections_by_ip),
+            **connection_stats,
+        },
+    }
+
+
 @app.get("/dms")
-async def get_user_dms(db: AsyncSession = Depends(get_db), credentials=Depends(security)):
+async def get_user_dms(db: AsyncSession = Depends(get_read_db), credentials=Depends(security)):
     """Get all DM rooms for current user"""
     token = credentials.credentials
     payload = verify_token(token)
@@ -146,68 +513,151 @@ async def get_user_dms(db: AsyncSession = Depends(get_db), credentials=Depends(s
 
     user_id = int(payload.get("sub"))
 
-    result = await db.execute(
-        select(Room, RoomMembership)
-        .join(RoomMembership)
-        .where(
-            Room.room_type == 'dm',
-            RoomMembership.user_id == user_id
+    dms = await fetch_user_dms(db, user_id)
+    return {'dms': [dm.as_dict() for dm in dms]}
+
+# Directorio de rooms: contadores denormalizados + cache de TTL corto
+ROOM_DIRECTORY_PAGE_SIZE = 50
+# Columnas solas (NOT NULL e indexadas) para que el orden use el índice
+ROOM_SORTS = {
+    "members": Room.member_count,
+    "activity": Room.last_activity_at,
+}
+room_directory_cache = TTLCache(ttl=ROOM_DIRECTORY_TTL)
+
+
+def encode_room_cursor(value, room_id: int) -> str:
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps([value, room_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_room_cursor(cursor: str, sort: str) -> tuple:
+    """Validar tipos: el cursor viene del cliente y va directo a la query"""
+    value, room_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    if type(room_id) is not int:
+        raise ValueError("Invalid room id")
+    if sort == "members":
+        if type(value) is not int:
+            raise ValueError("Invalid member count")
+    else:
+        if not isinstance(value, str):
+            raise ValueError("Invalid timestamp")
+        value = datetime.fromisoformat(value)
+    return value, room_id
+
+
+async def fetch_room_directory(
+    db: AsyncSession,
+    room_type: Optional[str],
+    sort: str,
+    limit: int,
+    after: Optional[tuple] = None,
+) -> dict:
+    """Página del directorio de rooms públicos con keyset pagination.
+
+    ``after`` es el cursor ya decodificado: (valor de orden, room id).
+    """
+    sort_column = ROOM_SORTS[sort]
+    query = select(
+        Room.id,
+        Room.name,
+        Room.description,
+        Room.room_type,
+        Room.member_count,
+        Room.message_count,
+        Room.last_activity_at,
+        sort_column.label("sort_value"),
+    ).where(Room.is_private.is_(False), Room.room_type != 'dm')
+
+    if room_type:
+        query = query.where(Room.room_type == room_type)
+
+    if after:
+        value, last_id = after
+        query = query.where(
+            or_(
+                sort_column < value,
+                and_(sort_column == value, Room.id < last_id),
+            )
         )
+
+    result = await db.execute(
+        query.order_by(sort_column.desc(), Room.id.desc()).limit(limit + 1)
     )
+    rows = result.all()
+    page = rows[:limit]
 
-    rooms_data = []
-    for room, membership in result.all():
-        other_members = await db.execute(
-            select(User, RoomMembership)
-            .join(RoomMembership)
-            .where(
-                RoomMembership.room_id == room.id,
-                RoomMembership.user_id != user_id
-            )
-        )
-        other_user = other_members.first()
+    next_cursor = None
+    if len(rows) > limit:
+        last = page[-1]
+        next_cursor = encode_room_cursor(last.sort_value, last.id)
 
-        if other_user:
-            other_user_obj, _ = other_user
+    return {
+        'rooms': [
+            {
+                'id': row.id,
+                'name': row.name,
+                'description': row.description,
+                'type': row.room_type,
+                'member_count': row.member_count,
+                'message_count': row.message_count,
+                'last_activity_at': (
+                    row.last_activity_at.isoformat()
+                    if row.last_activity_at else None
+                ),
+            }
+            for row in page
+        ],
+        'next_cursor': next_cursor,
+    }
 
-            # Get last message
-            last_msg = await db.execute(
-                select(Message)
-                .where(Message.room_id == room.id)
-                .order_by(Message.created_at.desc())
-                .limit(1)
-            )
-            last_message = last_msg.scalar_one_or_none()
-
-            # Count unread messages (messages after last_read_at)
-            unread_count = await db.execute(
-                select(Message)
-                .where(
-                    Message.room_id == room.id,
-                    Message.created_at > membership.last_read_at,
-                    Message.sender_id != user_id  # No contar propios mensajes
-                )
-            )
-            unread = len(unread_count.all())
 
-            rooms_data.append({
-                'id': room.id,
-                'name': room.name,
-                'type': 'dm',
-                'with_user': other_user_obj.username,
-                'with_user_id': other_user_obj.id,
-                'last_message': last_message.content if last_message else None,
-                'last_message_time': last_message.created_at.isoformat() if last_message else None,
-                'unread_count': unread
-            })
+@app.get("/rooms")
+async def list_rooms(
+        room_type: Optional[str] = None,
+        sort: str = "members",
+        limit: int = ROOM_DIRECTORY_PAGE_SIZE,
+        cursor: Optional[str] = None,
+        db: AsyncSession = Depends(get_read_db),
+        credentials=Depends(security)
+):
+    """List public rooms sorted by member count or recent activity"""
+    token = credentials.credentials
+    payload = verify_token(token)
+    if not payload:
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+    if sort not in ROOM_SORTS:
+        raise HTTPException(status_code=400, detail="Invalid sort")
+    limit = max(1, min(limit, 100))
+
+    cache_key = (room_type, sort, limit, cursor)
+    cached = room_directory_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    after = None
+    if cursor:
+        try:
+            after = decode_room_cursor(cursor, sort)
+        except (ValueError, TypeError):
+            raise HTTPException(
+                status_code=400, detail="Invalid cursor"
+            ) from None
+
+    data = await fetch_room_directory(db, room_type, sort, limit, after)
+
+    room_directory_cache.set(cache_key, data)
+    return data
 
-    return {'dms': rooms_data}
 
 @app.get("/messages/{room_id}")
 async def get_room_messages(
         room_id: int,
         limit: int = 50,
-        db: AsyncSession = Depends(get_db),
+        db: AsyncSession = Depends(get_read_db),
         credentials=Depends(security)
 ):
     """Get messages from a specific room"""
@@ -219,67 +669,185 @@ async def get_room_messages(
     user_id = int(payload.get("sub"))
 
     # Verify user is member of the room
-    membership = await db.execute(
-        select(RoomMembership)
-        .where(
-            RoomMembership.room_id == room_id,
-            RoomMembership.user_id == user_id
-        )
+    if not await is_room_member(db, room_id, user_id):
+        raise HTTPException(status_code=403, detail="Not a member of this room")
+
+    history = await fetch_room_history(db, room_id, limit)
+    return {'messages': [row.as_dict() for row in history]}
+
+
+def client_ip(environ) -> str:
+    return environ.get("REMOTE_ADDR") or "unknown"
+
+
+def require_admin(credentials=Depends(security)) -> int:
+    payload = verify_token(credentials.credentials)
+    if not payload:
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+    user_id = int(payload.get("sub"))
+    if user_id not in ADMIN_USER_IDS:
+        raise HTTPException(status_code=403, detail="Admin only")
+    return user_id
+
+
+@app.get("/admin/messages/export")
+async def export_messages(
+        room_id: Optional[int] = None,
+        user_id: Optional[int] = None,
+        format: str = "ndjson",
+        admin_id: int = Depends(require_admin)
+):
+    """Stream a room's or user's messages as NDJSON or CSV"""
+    # Import tardío: history_io (csv, argparse) solo lo usan los admins
+    from history_io import (
+        EXPORT_FORMATS,
+        export_query,
+        stream_csv,
+        stream_ndjson,
     )
 
-    if not membership.scalar_one_or_none():
-        raise HTTPException(status_code=403, detail="Not a member of this room")
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="Invalid format")
+    if room_id is None and user_id is None:
+        raise HTTPException(
+            status_code=400, detail="room_id or user_id required"
+        )
 
-    # Get messages
-    result = await db.execute(
-        select(Message, User)
-        .join(User, Message.sender_id == User.id)
-        .where(Message.room_id == room_id)
-        .order_by(Message.created_at.desc())
-        .limit(limit)
+    query = export_query(room_id, user_id)
+    stream = stream_csv if format == "csv" else stream_ndjson
+
+    async def body():
+        # Conexión propia: vive lo que dure el streaming de la respuesta
+        async with (replica_engine or engine).connect() as conn:
+            async for chunk in stream(conn, query):
+                yield chunk
+
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(body(), media_type=media_type)
+
+
+@app.post("/admin/messages/import")
+async def import_messages_endpoint(
+        request: Request,
+        format: str = "ndjson",
+        admin_id: int = Depends(require_admin)
+):
+    """Bulk-load messages from an NDJSON or CSV request body"""
+    from history_io import (
+        EXPORT_FORMATS,
+        IMPORT_ERRORS,
+        import_messages,
+        iter_csv_records,
+        iter_ndjson_records,
     )
 
-    messages = []
-    for message, user in result.all():
-        messages.append({
-            'id': message.id,
-            'message': message.content,
-            'username': user.username,
-            'sender_id': user.id,
-            'room_id': message.room_id,
-            'timestamp': message.created_at.isoformat()
-        })
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="Invalid format")
+
+    parse = iter_csv_records if format == "csv" else iter_ndjson_records
+    try:
+        async with engine.begin() as conn:
+            total = await import_messages(conn, parse(request.stream()))
+    except IMPORT_ERRORS as e:
+        # Los errores de SQLAlchemy traen el SQL y el lote entero
+        reason = getattr(e, "orig", None) or e
+        raise HTTPException(
+            status_code=400, detail=f"Invalid row: {reason}"
+        ) from e
 
-    return {'messages': list(reversed(messages))}
+    room_directory_cache.clear()
+    return {"imported": total}
 
 
 # WebSocket events
 @sio.event
-async def connect(sid, environ):
-    print(f"Client {sid} connected")
-    await sio.emit("connected", {"message": "Connected"}, room=sid)
+async def connect(sid, environ, auth=None):
+    """Validar token y límites en el handshake, antes de crear la sesión.
+
+    Rechazar aquí (ConnectionRefusedError) evita que sockets inválidos
+    ocupen memoria. Un cliente que manda ``auth={"token": ...}`` queda
+    autenticado sin el round-trip extra de ``authenticate``.
+    """
+    ip = client_ip(environ)
+    if len(socket_ips) >= MAX_CONNECTIONS:
+        connection_stats["refused_capacity"] += 1
+        raise socketio.exceptions.ConnectionRefusedError("Server full")
+    if connections_by_ip.get(ip, 0) >= MAX_CONNECTIONS_PER_IP:
+        connection_stats["refused_ip"] += 1
+        raise socketio.exceptions.ConnectionRefusedError(
+            "Too many connections"
+        )
+
+    # Reservar el lugar antes del await: si no, varios handshakes
+    # concurrentes de la misma IP pasan el chequeo a la vez
+    socket_ips[sid] = ip
+    connections_by_ip[ip] = connections_by_ip.get(ip, 0) + 1
+    try:
+        auth = auth if isinstance(auth, dict) else {}
+        token = auth.get("token")
+        user = None
+        if token:
+            user = await get_current_user_ws(token)
+            if not user:
+                connection_stats["refused_auth"] += 1
+                raise socketio.exceptions.ConnectionRefusedError(
+                    "Invalid token"
+                )
+        elif REQUIRE_HANDSHAKE_AUTH:
+            connection_stats["refused_auth"] += 1
+            raise socketio.exceptions.ConnectionRefusedError("Token required")
+
+        print(f"Client {sid} connected")
+        if user:
+            await start_session(
+                sid, user, auto_join=auth.get("auto_join", True)
+            )
+        else:
+            # Clientes viejos: tienen UNAUTHENTICATED_TIMEOUT para authenticate
+            unauthenticated_sockets[sid] = time.monotonic()
+            await sio.emit("connected", {"message": "Connected"}, room=sid)
+    except BaseException:
+        # Handshake rechazado o fallido: no hay disconnect que libere el lugar
+        release_connection(sid)
+        connected_users.pop(sid, None)
+        raise
+
+
+def release_connection(sid):
+    unauthenticated_sockets.pop(sid, None)
+    ip = socket_ips.pop(sid, None)
+    if ip is None:
+        return
+    if connections_by_ip.get(ip, 0) <= 1:
+        connections_by_ip.pop(ip, None)
+    else:
+        connections_by_ip[ip] -= 1
 
 
 @sio.event
 async def disconnect(sid):
     print(f"Client {sid} disconnected")
+    release_connection(sid)
     if sid in connected_users:
         user_data = connected_users[sid]
 
         # Update user status to offline
         async with AsyncSessionLocal() as db:
-            user = await get_user_by_id(db, user_data["user_id"])
+            user = await get_user_by_id(db, user_data.user_id)
             if user:
                 user.is_online = False
                 user.last_seen = datetime.utcnow()
                 await db.commit()
 
         del connected_users[sid]
+        for key in [k for k in typing_users if k[0] == sid]:
+            del typing_users[key]
 
         # Broadcast updated users list to all clients
         await sio.emit(
             "users_list",
-            {"users": [u["username"] for u in connected_users.values()]},
+            {"users": [u.username for u in connected_users.values()]},
         )
 
 
@@ -295,39 +863,62 @@ async def authenticate(sid, data):
         await sio.emit('auth_error', {'message': 'Invalid token'}, room=sid)
         return
 
+    await start_session(sid, user, auto_join=data.get('auto_join', False))
+
+
+async def start_session(sid, user: User, auto_join: bool = False):
+    """Registrar el socket como autenticado y anunciar la presencia"""
+    unauthenticated_sockets.pop(sid, None)
+
     # Remover sesiones anteriores del mismo usuario
     for old_sid, user_data in list(connected_users.items()):
-        if user_data['user_id'] == user.id and old_sid != sid:
+        if user_data.user_id == user.id and old_sid != sid:
             del connected_users[old_sid]
 
-    connected_users[sid] = {
-        'user_id': user.id,
-        'username': user.username,
-        'status': user.status,  # Agregar status
-        'sid': sid
-    }
+    connected_users[sid] = SocketSession(
+        user_id=user.id,
+        username=user.username,
+        status=user.status,
+        sid=sid,
+    )
 
     # Update user status to online
     async with AsyncSessionLocal() as db:
-        user.is_online = True
-        user.status = 'online'  # Reset to online on connect
+        await db.execute(
+            update(User)
+            .where(User.id == user.id)
+            .values(
+                is_online=True,
+                status='online',  # Reset to online on connect
+                last_seen=datetime.utcnow(),
+            )
+        )
         await db.commit()
 
-    await sio.emit('authenticated', {
+    # Auto-join opcional a todos los rooms (DMs incluidos) en un solo paso
+    joined_rooms = None
+    if auto_join:
+        joined_rooms = await join_user_rooms(sid, user.id)
+
+    authenticated_data = {
         'user': {
             'id': user.id,
             'username': user.username,
             'email': user.email,
             'status': 'online'
         }
-    }, room=sid)
+    }
+    if joined_rooms is not None:
+        authenticated_data['rooms'] = joined_rooms
+
+    await sio.emit('authenticated', authenticated_data, room=sid)
 
     # Send updated users list with status
     users_with_status = []
     for user_data in connected_users.values():
         users_with_status.append({
-            'username': user_data['username'],
-            'status': user_data.get('status', 'online')
+            'username': user_data.username,
+            'status': user_data.status or 'online'
         })
 
     await sio.emit('users_list_with_status', {
@@ -345,10 +936,27 @@ async def join_room(sid, data):
     await sio.enter_room(sid, room_name)
 
     user_data = connected_users[sid]
-    print(f"User {user_data['username']} joined {room_name}")  # Debug
+    print(f"User {user_data.username} joined {room_name}")  # Debug
+
+    # Persistir la membresía solo en rooms del directorio: unirse a un
+    # room privado o DM no puede dar acceso a su historial
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(Room.id).where(
+                Room.id == room_id,
+                Room.is_private.is_(False),
+                Room.room_type != 'dm',
+            )
+        )
+        if result.first():
+            if not await add_room_members(db, room_id, [user_data.user_id]):
+                # Ya era miembro (reconnect, cambio de room): sin broadcast
+                return
+            await db.commit()
+            mark_user_write(user_data.user_id)
 
     await sio.emit('user_joined_room', {
-        'user': user_data['username'],
+        'user': user_data.username,
         'room_id': room_id
     }, room=room_name)
 
@@ -363,7 +971,7 @@ async def send_message(sid, data):
     content = data.get('message', '')
     room_name = f"room_{room_id}"
 
-    print(f"Message from {connected_users[sid]['username']} to {room_name}: {content}")  # Debug
+    print(f"Message from {connected_users[sid].username} to {room_name}: {content}")  # Debug
 
     if not content.strip():
         return
@@ -372,25 +980,14 @@ async def send_message(sid, data):
 
     # Save to database
     async with AsyncSessionLocal() as db:
-        message = Message(
-            content=content,
-            sender_id=user_data['user_id'],
-            room_id=room_id
-        )
-        db.add(message)
+        message = await insert_message(db, user_data.user_id, room_id, content)
         await db.commit()
-        await db.refresh(message)
-
-        message_data = {
-            'id': message.id,
-            'message': message.content,
-            'username': user_data['username'],
-            'room_id': room_id,
-            'timestamp': message.created_at.isoformat()
-        }
+    mark_user_write(user_data.user_id)
+
+    message_data = message.as_event(user_data.username)
 
     print(f"Broadcasting message to {room_name}")  # Debug
-    await sio.emit('new_message', message_data, room=room_name)
+    broadcaster.publish(room_name, 'new_message', message_data)
 
 
 @sio.event
@@ -401,10 +998,11 @@ async def typing_start(sid, data):
 
     room_id = data.get("room_id", 1)
     user_data = connected_users[sid]
+    typing_users[(sid, room_id)] = time.monotonic()
 
     await sio.emit(
         "typing_start",
-        {"username": user_data["username"], "room_id": room_id},
+        {"username": user_data.username, "room_id": room_id},
         room=f"room_{room_id}",
         skip_sid=sid,
     )  # No enviar al que está escribiendo
@@ -418,10 +1016,11 @@ async def typing_stop(sid, data):
 
     room_id = data.get("room_id", 1)
     user_data = connected_users[sid]
+    typing_users.pop((sid, room_id), None)
 
     await sio.emit(
         "typing_stop",
-        {"username": user_data["username"], "room_id": room_id},
+        {"username": user_data.username, "room_id": room_id},
         room=f"room_{room_id}",
         skip_sid=sid,
     )
@@ -438,17 +1037,17 @@ async def update_status(sid, data):
 
     # Update in database
     async with AsyncSessionLocal() as db:
-        user = await get_user_by_id(db, user_data['user_id'])
+        user = await get_user_by_id(db, user_data.user_id)
         if user:
             user.status = status
             await db.commit()
 
     # Update connected users store
-    connected_users[sid]['status'] = status
+    connected_users[sid].status = status
 
     # Broadcast status change
     await sio.emit('status_changed', {
-        'username': user_data['username'],
+        'username': user_data.username,
         'status': status
     })
 
@@ -456,8 +1055,8 @@ async def update_status(sid, data):
     users_with_status = []
     for user_data in connected_users.values():
         users_with_status.append({
-            'username': user_data['username'],
-            'status': user_data.get('status', 'online')
+            'username': user_data.username,
+            'status': user_data.status or 'online'
         })
 
     await sio.emit('users_list_with_status', {
@@ -476,7 +1075,7 @@ async def create_dm(sid, data):
     # Buscar usuario objetivo
     target_user_data = None
     for user_data in connected_users.values():
-        if user_data['username'] == target_username:
+        if user_data.username == target_username:
             target_user_data = user_data
             break
 
@@ -486,15 +1085,13 @@ async def create_dm(sid, data):
 
     async with AsyncSessionLocal() as db:
         # Buscar DM existente en ambas direcciones
-        from sqlalchemy import or_, and_
-
         existing = await db.execute(
             select(Room).where(
                 and_(
                     Room.room_type == 'dm',
                     or_(
-                        Room.name == f"{current_user['username']}_{target_username}",
-                        Room.name == f"{target_username}_{current_user['username']}"
+                        Room.name == f"{current_user.username}_{target_username}",
+                        Room.name == f"{target_username}_{current_user.username}"
                     )
                 )
             )
@@ -504,31 +1101,35 @@ async def create_dm(sid, data):
         if not room:
             # Crear nueva
             room = Room(
-                name=f"{current_user['username']}_{target_username}",
+                name=f"{current_user.username}_{target_username}",
                 description=f"DM",
                 is_private=True,
                 room_type='dm',
-                created_by=current_user['user_id']
+                created_by=current_user.user_id
             )
             db.add(room)
             await db.commit()
             await db.refresh(room)
 
-            for user_id in [current_user['user_id'], target_user_data['user_id']]:
-                membership = RoomMembership(user_id=user_id, room_id=room.id)
-                db.add(membership)
+            await add_room_members(
+                db,
+                room.id,
+                [current_user.user_id, target_user_data.user_id],
+            )
             await db.commit()
+            mark_user_write(current_user.user_id)
+            mark_user_write(target_user_data.user_id)
 
     dm_room_name = f"dm_{room.id}"
     await sio.enter_room(sid, dm_room_name)
-    await sio.enter_room(target_user_data['sid'], dm_room_name)
+    await sio.enter_room(target_user_data.sid, dm_room_name)
 
     room_data = {
         'id': room.id,
         'name': room.name,
         'type': 'dm',
         'with_user': target_username,
-        'with_user_id': target_user_data['user_id']
+        'with_user_id': target_user_data.user_id
     }
 
     await sio.emit('dm_created', room_data, room=sid)
@@ -549,25 +1150,22 @@ async def send_dm(sid, data):
 
     # Save to database
     async with AsyncSessionLocal() as db:
-        message = Message(
-            content=content,
-            sender_id=user_data['user_id'],
-            room_id=room_id
-        )
-        db.add(message)
+        message = await insert_message(db, user_data.user_id, room_id, content)
         await db.commit()
-        await db.refresh(message)
-
-        message_data = {
-            'id': message.id,
-            'message': message.content,
-            'username': user_data['username'],
-            'room_id': room_id,
-            'timestamp': message.created_at.isoformat(),
-            'type': 'dm'
-        }
+    mark_user_write(user_data.user_id)
+
+    message_data = message.as_event(user_data.username)
+    message_data['type'] = 'dm'
+
+    broadcaster.publish(f"dm_{room_id}", 'new_dm_message', message_data)
 
-    await sio.emit('new_dm_message', message_data, room=f"dm_{room_id}")
+
+if QUERY_PROFILING:
+    # Después de registrar todos los handlers
+    profiler.instrument_sio(sio)
 
 if __name__ == "__main__":
+    # Import tardío: uvicorn solo hace falta al correr el script
+    import uvicorn
+
     uvicorn.run(socket_app, host="0.0.0.0", port=8000)
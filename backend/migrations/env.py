@@ -0,0 +1,56 @@
+"""Entorno de Alembic.
+
+Desde la CLI se conecta a DATABASE_URL con el driver async. ``init_db``
+corre las migraciones en proceso y pasa su propia conexión (sync, vía
+``run_sync``) en ``config.attributes["connection"]``.
+"""
+
+import asyncio
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from models import Base
+
+config = context.config
+target_metadata = Base.metadata
+
+
+def run_with_connection(connection):
+    context.configure(connection=connection, target_metadata=target_metadata)
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+async def run_online():
+    from database import ASYNC_DATABASE_URL
+
+    engine = create_async_engine(ASYNC_DATABASE_URL)
+    async with engine.begin() as conn:
+        await conn.run_sync(run_with_connection)
+    await engine.dispose()
+
+
+def run_offline():
+    from database import ASYNC_DATABASE_URL
+
+    context.configure(
+        url=ASYNC_DATABASE_URL,
+        target_metadata=target_metadata,
+        literal_binds=True,
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+connection = config.attributes.get("connection")
+if connection is not None:
+    run_with_connection(connection)
+else:
+    if config.config_file_name is not None:
+        fileConfig(config.config_file_name)
+    if context.is_offline_mode():
+        run_offline()
+    else:
+        asyncio.run(run_online())
@@ -0,0 +1,86 @@
+"""Schema inicial (el que creaba create_all antes de versionar la DB)
+
+Una DB creada con create_all antes de las migraciones tiene exactamente
+este schema: ``init_db`` la marca con esta revisión y sigue desde acá.
+
+Revision ID: 0001
+Revises:
+Create Date: 2025-01-01 00:00:00
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "users",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("username", sa.String(), nullable=False),
+        sa.Column("email", sa.String(), nullable=False),
+        sa.Column("hashed_password", sa.String(), nullable=False),
+        sa.Column("is_online", sa.Boolean()),
+        sa.Column("status", sa.String()),
+        sa.Column("last_seen", sa.DateTime()),
+        sa.Column("created_at", sa.DateTime()),
+    )
+    op.create_index("ix_users_id", "users", ["id"])
+    op.create_index("ix_users_username", "users", ["username"], unique=True)
+    op.create_index("ix_users_email", "users", ["email"], unique=True)
+
+    op.create_table(
+        "rooms",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("description", sa.Text()),
+        sa.Column("is_private", sa.Boolean()),
+        sa.Column("room_type", sa.String()),
+        sa.Column("created_by", sa.Integer(), sa.ForeignKey("users.id")),
+        sa.Column("created_at", sa.DateTime()),
+    )
+    op.create_index("ix_rooms_id", "rooms", ["id"])
+
+    op.create_table(
+        "messages",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("content", sa.Text(), nullable=False),
+        sa.Column("message_type", sa.String()),
+        sa.Column("file_url", sa.String()),
+        sa.Column(
+            "sender_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False
+        ),
+        sa.Column(
+            "room_id", sa.Integer(), sa.ForeignKey("rooms.id"), nullable=False
+        ),
+        sa.Column("reply_to", sa.Integer(), sa.ForeignKey("messages.id")),
+        sa.Column("reactions", sa.JSON()),
+        sa.Column("created_at", sa.DateTime()),
+    )
+    op.create_index("ix_messages_id", "messages", ["id"])
+
+    op.create_table(
+        "room_memberships",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column(
+            "user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False
+        ),
+        sa.Column(
+            "room_id", sa.Integer(), sa.ForeignKey("rooms.id"), nullable=False
+        ),
+        sa.Column("joined_at", sa.DateTime()),
+        sa.Column("is_admin", sa.Boolean()),
+        sa.Column("last_read_at", sa.DateTime()),
+    )
+    op.create_index("ix_room_memberships_id", "room_memberships", ["id"])
+
+
+def downgrade():
+    op.drop_table("room_memberships")
+    op.drop_table("messages")
+    op.drop_table("rooms")
+    op.drop_table("users")
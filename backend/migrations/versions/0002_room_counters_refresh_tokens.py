@@ -0,0 +1,113 @@
+"""Contadores del directorio de rooms y refresh tokens
+
+Agrega ``member_count``, ``message_count`` y ``last_activity_at`` a
+``rooms`` y los calcula a partir de ``room_memberships`` y ``messages``
+(``last_activity_at`` queda NOT NULL: sin mensajes, la creación del room).
+Borra membresías duplicadas y agrega un unique en ``(room_id, user_id)``.
+Crea la tabla ``refresh_tokens``.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2025-01-02 00:00:00
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        "rooms",
+        sa.Column(
+            "member_count", sa.Integer(), nullable=False, server_default="0"
+        ),
+    )
+    op.add_column(
+        "rooms",
+        sa.Column(
+            "message_count", sa.Integer(), nullable=False, server_default="0"
+        ),
+    )
+    op.add_column("rooms", sa.Column("last_activity_at", sa.DateTime()))
+
+    # Antes del backfill: los duplicados no cuentan como miembros
+    op.execute(
+        """
+        DELETE FROM room_memberships WHERE id NOT IN (
+            SELECT min(id) FROM room_memberships GROUP BY room_id, user_id
+        )
+        """
+    )
+    # batch: SQLite no soporta ADD CONSTRAINT (recrea la tabla)
+    with op.batch_alter_table("room_memberships") as batch:
+        batch.create_unique_constraint(
+            "uq_room_memberships_room_user", ["room_id", "user_id"]
+        )
+
+    # Backfill: subqueries correlacionadas (valen en Postgres y SQLite)
+    op.execute(
+        """
+        UPDATE rooms SET
+            member_count = (
+                SELECT count(*) FROM room_memberships
+                WHERE room_memberships.room_id = rooms.id
+            ),
+            message_count = (
+                SELECT count(*) FROM messages
+                WHERE messages.room_id = rooms.id
+            ),
+            last_activity_at = COALESCE(
+                (
+                    SELECT max(messages.created_at) FROM messages
+                    WHERE messages.room_id = rooms.id
+                ),
+                rooms.created_at,
+                CURRENT_TIMESTAMP
+            )
+        """
+    )
+    # NOT NULL: el directorio ordena por la columna sola y usa el índice
+    with op.batch_alter_table("rooms") as batch:
+        batch.alter_column(
+            "last_activity_at", existing_type=sa.DateTime(), nullable=False
+        )
+    op.create_index("ix_rooms_member_count", "rooms", ["member_count"])
+    op.create_index("ix_rooms_last_activity_at", "rooms", ["last_activity_at"])
+
+    op.create_table(
+        "refresh_tokens",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column(
+            "user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False
+        ),
+        sa.Column("token_hash", sa.String(), nullable=False),
+        sa.Column("expires_at", sa.DateTime(), nullable=False),
+        sa.Column("revoked_at", sa.DateTime()),
+        sa.Column("created_at", sa.DateTime()),
+    )
+    op.create_index("ix_refresh_tokens_id", "refresh_tokens", ["id"])
+    op.create_index("ix_refresh_tokens_user_id", "refresh_tokens", ["user_id"])
+    op.create_index(
+        "ix_refresh_tokens_token_hash",
+        "refresh_tokens",
+        ["token_hash"],
+        unique=True,
+    )
+
+
+def downgrade():
+    op.drop_table("refresh_tokens")
+    op.drop_index("ix_rooms_last_activity_at", table_name="rooms")
+    op.drop_index("ix_rooms_member_count", table_name="rooms")
+    with op.batch_alter_table("room_memberships") as batch:
+        batch.drop_constraint("uq_room_memberships_room_user", type_="unique")
+    # batch: SQLite no soporta DROP COLUMN con índices/constraints
+    with op.batch_alter_table("rooms") as batch:
+        batch.drop_column("last_activity_at")
+        batch.drop_column("message_count")
+        batch.drop_column("member_count")
@@ -7,6 +7,7 @@ from sqlalchemy import (
     Boolean,
     Text,
     JSON,
+    UniqueConstraint,
 )
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
@@ -30,6 +31,7 @@ class User(Base):
     # Relationships
     sent_messages = relationship("Message", back_populates="sender")
     room_memberships = relationship("RoomMembership", back_populates="user")
+    refresh_tokens = relationship("RefreshToken", back_populates="user")
 
 
 class Room(Base):
@@ -43,6 +45,17 @@ class Room(Base):
     created_by = Column(Integer, ForeignKey("users.id"))
     created_at = Column(DateTime, default=datetime.utcnow)
 
+    # Contadores denormalizados para el directorio de rooms
+    member_count = Column(
+        Integer, default=0, server_default="0", nullable=False, index=True
+    )
+    message_count = Column(
+        Integer, default=0, server_default="0", nullable=False
+    )
+    last_activity_at = Column(
+        DateTime, default=datetime.utcnow, nullable=False, index=True
+    )
+
     # Relationships
     messages = relationship("Message", back_populates="room")
     memberships = relationship("RoomMembership", back_populates="room")
@@ -68,6 +81,12 @@ class Message(Base):
 
 class RoomMembership(Base):
     __tablename__ = "room_memberships"
+    __table_args__ = (
+        # Un usuario es miembro de un room una sola vez (member_count)
+        UniqueConstraint(
+            "room_id", "user_id", name="uq_room_memberships_room_user"
+        ),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -79,3 +98,20 @@ class RoomMembership(Base):
     # Relationships
     user = relationship("User", back_populates="room_memberships")
     room = relationship("Room", back_populates="memberships")
+
+
+class RefreshToken(Base):
+    __tablename__ = "refresh_tokens"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(
+        Integer, ForeignKey("users.id"), nullable=False, index=True
+    )
+    # Solo se guarda el hash (sha256) del token, nunca el token
+    token_hash = Column(String, unique=True, index=True, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+    revoked_at = Column(DateTime)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    # Relationships
+    user = relationship("User", back_populates="refresh_tokens")
@@ -0,0 +1,185 @@
+"""Profiling opcional de queries SQL por endpoint y evento de Socket.IO.
+
+Con QUERY_PROFILING=1 se cuentan los statements y el tiempo de DB de cada
+request REST y cada handler ``@sio.event``. Si un mismo statement (misma
+forma, distintos parámetros) se repite varias veces en un scope, se marca
+como posible N+1.
+"""
+
+import contextvars
+import functools
+import os
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Optional
+
+from sqlalchemy import event
+
+QUERY_PROFILING = os.getenv("QUERY_PROFILING") == "1"
+
+# Repeticiones de la misma forma de statement para marcar N+1
+N_PLUS_ONE_THRESHOLD = 5
+
+_current_scope: contextvars.ContextVar[Optional["QueryScope"]] = (
+    contextvars.ContextVar("query_scope", default=None)
+)
+
+_WHITESPACE = re.compile(r"\s+")
+# Listas de parámetros de IN (...) de largo variable -> una sola forma
+_PARAM_LIST = re.compile(r"\((?:\s*(?:\?|\$\d+|%s)\s*,)+\s*(?:\?|\$\d+|%s)\s*\)")
+
+
+def statement_shape(statement: str) -> str:
+    shape = _WHITESPACE.sub(" ", statement).strip()
+    return _PARAM_LIST.sub("(?)", shape)
+
+
+class QueryScope:
+    def __init__(self, name: str, parent: Optional["QueryScope"] = None):
+        self.name = name
+        self.parent = parent
+        self.count = 0
+        self.db_time = 0.0
+        self.shapes = Counter()
+
+    def record(self, statement: str, duration: float):
+        shape = statement_shape(statement)
+        scope = self
+        # Los scopes anidados (p. ej. un test alrededor de un request)
+        # también ven los statements
+        while scope is not None:
+            scope.count += 1
+            scope.db_time += duration
+            scope.shapes[shape] += 1
+            scope = scope.parent
+
+    def repeated(self, threshold: int = N_PLUS_ONE_THRESHOLD) -> dict:
+        return {
+            shape: count
+            for shape, count in self.shapes.items()
+            if count >= threshold
+        }
+
+    def summary(self) -> str:
+        lines = [
+            f"{self.name}: {self.count} statements, "
+            f"{self.db_time * 1000:.1f} ms"
+        ]
+        for shape, count in self.shapes.most_common():
+            lines.append(f"  {count}x {shape[:200]}")
+        return "\n".join(lines)
+
+
+class QueryProfiler:
+    def __init__(self, n_plus_one_threshold: int = N_PLUS_ONE_THRESHOLD):
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self.stats: dict[str, dict] = {}
+        self._engines = []
+
+    def attach(self, engine):
+        sync_engine = getattr(engine, "sync_engine", engine)
+        event.listen(sync_engine, "before_cursor_execute", self._before)
+        event.listen(sync_engine, "after_cursor_execute", self._after)
+        self._engines.append(sync_engine)
+
+    def detach(self):
+        for sync_engine in self._engines:
+            event.remove(sync_engine, "before_cursor_execute", self._before)
+            event.remove(sync_engine, "after_cursor_execute", self._after)
+        self._engines.clear()
+
+    def _before(self, conn, cursor, statement, parameters, context, many):
+        # En el contexto de ejecución y no en conn.info: si el statement
+        # falla no hay after_cursor_execute y no queda nada colgado
+        if context is not None:
+            context._query_start = time.perf_counter()
+
+    def _after(self, conn, cursor, statement, parameters, context, many):
+        start = getattr(context, "_query_start", None)
+        scope = _current_scope.get()
+        if scope is not None and start is not None:
+            scope.record(statement, time.perf_counter() - start)
+
+    @contextmanager
+    def scope(self, name: str):
+        """Atribuir a ``name`` los statements ejecutados dentro del bloque"""
+        scope = QueryScope(name, parent=_current_scope.get())
+        token = _current_scope.set(scope)
+        try:
+            yield scope
+        finally:
+            _current_scope.reset(token)
+            self._collect(scope)
+
+    def _collect(self, scope: QueryScope):
+        stats = self.stats.setdefault(
+            scope.name,
+            {
+                "calls": 0,
+                "statements": 0,
+                "max_statements": 0,
+                "db_time": 0.0,
+                "n_plus_one": {},
+            },
+        )
+        stats["calls"] += 1
+        stats["statements"] += scope.count
+        stats["max_statements"] = max(stats["max_statements"], scope.count)
+        stats["db_time"] += scope.db_time
+
+        for shape, count in scope.repeated(self.n_plus_one_threshold).items():
+            if shape not in stats["n_plus_one"]:
+                print(
+                    f"[query profiling] posible N+1 en {scope.name}: "
+                    f"{count}x {shape[:200]}"
+                )
+            stats["n_plus_one"][shape] = max(
+                stats["n_plus_one"].get(shape, 0), count
+            )
+
+    def report(self) -> dict:
+        return {
+            name: {
+                **stats,
+                "avg_statements": stats["statements"] / stats["calls"],
+                "avg_db_time_ms": stats["db_time"] * 1000 / stats["calls"],
+            }
+            for name, stats in self.stats.items()
+        }
+
+    def instrument_sio(self, sio, namespace: str = "/"):
+        """Envolver los handlers ``@sio.event`` ya registrados"""
+        handlers = sio.handlers.get(namespace, {})
+        for name, handler in list(handlers.items()):
+            handlers[name] = self._wrap_handler(f"sio:{name}", handler)
+
+    def _wrap_handler(self, scope_name: str, handler):
+        @functools.wraps(handler)
+        async def wrapper(*args):
+            with self.scope(scope_name):
+                return await handler(*args)
+
+        return wrapper
+
+
+class QueryProfilingMiddleware:
+    """Middleware ASGI que abre un scope por request REST"""
+
+    def __init__(self, app, profiler: QueryProfiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        with self.profiler.scope("http") as query_scope:
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                # Después del routing ya se conoce el path template
+                route = scope.get("route")
+                path = getattr(route, "path", scope["path"])
+                query_scope.name = f"{scope['method']} {path}"
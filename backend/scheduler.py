@@ -0,0 +1,229 @@
+"""Scheduler asyncio en proceso para tareas de mantenimiento.
+
+Cada job corre en su propia task con intervalo con jitter y timeout. Los
+jobs ``singleton`` solo corren en el worker que tiene el advisory lock de
+Postgres (leader election); el resto corre en todos los workers.
+
+El lock se toma en una conexión propia (fuera del pool de la app) en modo
+AUTOCOMMIT: así no queda "idle in transaction" mientras el worker es leader
+ni le quita un slot del pool a los requests.
+"""
+
+import asyncio
+import random
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import (
+    AsyncConnection,
+    AsyncEngine,
+    create_async_engine,
+)
+from sqlalchemy.pool import NullPool
+
+# Clave del advisory lock para leader election (arbitraria pero fija)
+LEADER_LOCK_KEY = 727_001
+
+
+@dataclass
+class JobStats:
+    runs: int = 0
+    failures: int = 0
+    timeouts: int = 0
+    skipped: int = 0
+    last_duration: Optional[float] = None
+    max_duration: float = 0.0
+    total_duration: float = 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "runs": self.runs,
+            "failures": self.failures,
+            "timeouts": self.timeouts,
+            "skipped": self.skipped,
+            "last_duration": self.last_duration,
+            "max_duration": self.max_duration,
+            "avg_duration": (
+                self.total_duration / self.runs if self.runs else None
+            ),
+        }
+
+
+@dataclass
+class Job:
+    name: str
+    func: Callable[[], Awaitable[None]]
+    interval: float
+    jitter: float = 0.1
+    timeout: Optional[float] = None
+    singleton: bool = False
+    stats: JobStats = field(default_factory=JobStats)
+
+    def next_delay(self) -> float:
+        """Intervalo con jitter (+/- jitter * interval)"""
+        spread = self.interval * self.jitter
+        return max(0.0, self.interval + random.uniform(-spread, spread))
+
+
+class Scheduler:
+    def __init__(
+        self, engine: AsyncEngine, lock_key: int = LEADER_LOCK_KEY
+    ):
+        self.engine = engine
+        self.lock_key = lock_key
+        self.jobs: dict[str, Job] = {}
+        self._tasks: list[asyncio.Task] = []
+        self._leader_conn: Optional[AsyncConnection] = None
+        self._lock_engine: Optional[AsyncEngine] = None
+        self._leader_lock = asyncio.Lock()
+
+    def add_job(
+        self,
+        name: str,
+        func: Callable[[], Awaitable[None]],
+        interval: float,
+        *,
+        jitter: float = 0.1,
+        timeout: Optional[float] = None,
+        singleton: bool = False,
+    ) -> Job:
+        if name in self.jobs:
+            raise ValueError(f"Job '{name}' already registered")
+        job = Job(
+            name=name,
+            func=func,
+            interval=interval,
+            jitter=jitter,
+            timeout=timeout,
+            singleton=singleton,
+        )
+        self.jobs[name] = job
+        return job
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    async def start(self):
+        if self.running:
+            return
+        for job in self.jobs.values():
+            self._tasks.append(
+                asyncio.create_task(self._loop(job), name=f"job:{job.name}")
+            )
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+        await self._release_leadership()
+        if self._lock_engine is not None:
+            await self._lock_engine.dispose()
+            self._lock_engine = None
+
+    def lock_engine(self) -> AsyncEngine:
+        """Engine dedicado al advisory lock: sin pool y en AUTOCOMMIT"""
+        if self._lock_engine is None:
+            self._lock_engine = create_async_engine(
+                self.engine.url,
+                poolclass=NullPool,
+                isolation_level="AUTOCOMMIT",
+            )
+        return self._lock_engine
+
+    async def is_leader(self) -> bool:
+        """Intentar tomar (o confirmar) el advisory lock de leader.
+
+        Fuera de Postgres no hay varios workers compartiendo DB, así que el
+        proceso es siempre leader.
+        """
+        if self.engine.dialect.name != "postgresql":
+            return True
+
+        async with self._leader_lock:
+            if self._leader_conn is not None:
+                try:
+                    await self._leader_conn.execute(text("SELECT 1"))
+                    return True
+                except Exception:
+                    # Conexión perdida: el lock se liberó con ella
+                    await self._release_leadership()
+
+            conn = await self.lock_engine().connect()
+            try:
+                acquired = await conn.scalar(
+                    text("SELECT pg_try_advisory_lock(:key)"),
+                    {"key": self.lock_key},
+                )
+            except Exception:
+                await conn.close()
+                raise
+
+            if not acquired:
+                await conn.close()
+                return False
+
+            # Mantener la conexión abierta mientras seamos leader
+            self._leader_conn = conn
+            return True
+
+    async def _release_leadership(self):
+        conn, self._leader_conn = self._leader_conn, None
+        if conn is None:
+            return
+        try:
+            await conn.execute(
+                text("SELECT pg_advisory_unlock(:key)"),
+                {"key": self.lock_key},
+            )
+        except Exception:
+            pass
+        finally:
+            await conn.close()
+
+    async def _loop(self, job: Job):
+        while True:
+            await asyncio.sleep(job.next_delay())
+            await self.run_job(job)
+
+    async def run_job(self, job: Job):
+        """Ejecutar un job una vez registrando duración y errores"""
+        if job.singleton:
+            try:
+                leader = await self.is_leader()
+            except Exception as e:
+                print(f"Job {job.name}: leader election falló: {e}")
+                leader = False
+            if not leader:
+                job.stats.skipped += 1
+                return
+
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(job.func(), timeout=job.timeout)
+        except TimeoutError:
+            job.stats.timeouts += 1
+            print(f"Job {job.name}: timeout después de {job.timeout}s")
+        except Exception as e:
+            job.stats.failures += 1
+            print(f"Job {job.name} falló: {e}")
+        finally:
+            duration = time.perf_counter() - start
+            job.stats.runs += 1
+            job.stats.last_duration = duration
+            job.stats.total_duration += duration
+            job.stats.max_duration = max(job.stats.max_duration, duration)
+
+    def metrics(self) -> dict:
+        return {
+            name: {
+                "interval": job.interval,
+                "singleton": job.singleton,
+                **job.stats.as_dict(),
+            }
+            for name, job in self.jobs.items()
+        }
@@ -11,3 +11,7 @@ class UserRegister(BaseModel):
 class UserLogin(BaseModel):
     email: str
     password: str
+
+
+class TokenRefresh(BaseModel):
+    refresh_token: str
@@ -0,0 +1,98 @@
+from contextlib import contextmanager
+
+import pytest
+import pytest_asyncio
+from httpx import AsyncClient, ASGITransport
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+
+from main import app, socket_app, get_read_db
+from database import get_db, Base
+from profiling import QueryProfiler
+
+# --- Test Database Setup (SQLite in-memory) ---
+TEST_DATABASE_URL = "sqlite+aiosqlite:///:memory:"
+engine = create_async_engine(
+    TEST_DATABASE_URL, connect_args={"check_same_thread": False}
+)
+TestingSessionLocal = async_sessionmaker(
+    autocommit=False, autoflush=False, bind=engine, class_=AsyncSession
+)
+
+
+# --- Pytest Fixtures ---
+
+@pytest_asyncio.fixture(scope="function")
+async def db_session() -> AsyncSession:
+    """Provides a clean database session for each test function."""
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session = TestingSessionLocal()
+    try:
+        yield session
+    finally:
+        await session.close()
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+
+
+@pytest_asyncio.fixture(scope="function")
+async def client(db_session: AsyncSession) -> AsyncClient:
+    """Provides an async test client for making API requests."""
+    async def override_get_db():
+        """Override dependency to use the test session."""
+        try:
+            yield db_session
+        finally:
+            await db_session.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_db
+
+    transport = ASGITransport(app=socket_app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        yield ac
+
+@pytest_asyncio.fixture(scope="function")
+async def sio_emits(db_session: AsyncSession, monkeypatch) -> list:
+    """Runs socket handlers against the test DB and records emitted events."""
+    import main
+
+    emitted = []
+
+    async def fake_emit(event, data=None, room=None, **kwargs):
+        emitted.append((event, data, room))
+
+    monkeypatch.setattr(main, "AsyncSessionLocal", TestingSessionLocal)
+    monkeypatch.setattr(main.sio, "emit", fake_emit)
+    try:
+        yield emitted
+    finally:
+        await main.broadcaster.close()
+        main.connected_users.clear()
+        main.typing_users.clear()
+        main.socket_ips.clear()
+        main.connections_by_ip.clear()
+        main.unauthenticated_sockets.clear()
+
+
+@pytest.fixture(scope="function")
+def query_budget():
+    """Asserts a block issues at most N SQL statements against the test DB.
+
+    Usage: ``with query_budget(4): await client.get("/dms", ...)``
+    """
+    profiler = QueryProfiler()
+    profiler.attach(engine)
+
+    @contextmanager
+    def budget(max_statements: int, name: str = "test"):
+        with profiler.scope(name) as scope:
+            yield scope
+        assert scope.count <= max_statements, (
+            f"Query budget exceeded ({max_statements})\n{scope.summary()}"
+        )
+
+    try:
+        yield budget
+    finally:
+        profiler.detach()
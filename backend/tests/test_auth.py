@@ -98,4 +98,82 @@ async def test_login_failure_wrong_email(client: AsyncClient):
         json={"email": "nonexistent@example.com", "password": "password123"},
     )
     assert response.status_code == 401
-    assert response.json()["detail"] == "Invalid credentials"
\ No newline at end of file
+    assert response.json()["detail"] == "Invalid credentials"
+
+async def login_tokens(client: AsyncClient, username: str) -> dict:
+    """Register and log in a user, returning the login response."""
+    await client.post(
+        "/auth/register",
+        json={
+            "username": username,
+            "email": f"{username}@example.com",
+            "password": "password123",
+        },
+    )
+    response = await client.post(
+        "/auth/login",
+        json={"email": f"{username}@example.com", "password": "password123"},
+    )
+    return response.json()
+
+
+async def test_refresh_rotates_token(client: AsyncClient):
+    """Test a refresh token yields new tokens and cannot be used twice."""
+    tokens = await login_tokens(client, "refreshuser")
+    assert "refresh_token" in tokens
+
+    response = await client.post(
+        "/auth/refresh", json={"refresh_token": tokens["refresh_token"]}
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert "access_token" in data
+    assert data["refresh_token"] != tokens["refresh_token"]
+
+    # The rotated-out token is no longer valid
+    response = await client.post(
+        "/auth/refresh", json={"refresh_token": tokens["refresh_token"]}
+    )
+    assert response.status_code == 401
+
+
+async def test_refresh_reuse_revokes_all_tokens(client: AsyncClient):
+    """Test replaying a rotated token revokes the whole token family."""
+    tokens = await login_tokens(client, "reuseuser")
+    response = await client.post(
+        "/auth/refresh", json={"refresh_token": tokens["refresh_token"]}
+    )
+    new_token = response.json()["refresh_token"]
+
+    await client.post(
+        "/auth/refresh", json={"refresh_token": tokens["refresh_token"]}
+    )
+
+    response = await client.post(
+        "/auth/refresh", json={"refresh_token": new_token}
+    )
+    assert response.status_code == 401
+
+
+async def test_logout_revokes_refresh_token(client: AsyncClient):
+    """Test a logged-out refresh token can no longer be used."""
+    tokens = await login_tokens(client, "logoutuser")
+
+    response = await client.post(
+        "/auth/logout", json={"refresh_token": tokens["refresh_token"]}
+    )
+    assert response.status_code == 200
+
+    response = await client.post(
+        "/auth/refresh", json={"refresh_token": tokens["refresh_token"]}
+    )
+    assert response.status_code == 401
+
+
+async def test_refresh_invalid_token(client: AsyncClient):
+    """Test an unknown refresh token is rejected."""
+    response = await client.post(
+        "/auth/refresh", json={"refresh_token": "not-a-real-token"}
+    )
+    assert response.status_code == 401
+    assert response.json()["detail"] == "Invalid refresh token"
@@ -0,0 +1,47 @@
+import pytest
+
+import main
+from benchmarks.suite import compare, run_suite
+
+# Mark all tests in this file as asyncio
+pytestmark = pytest.mark.asyncio
+
+
+def report(**medians) -> dict:
+    return {
+        "meta": {},
+        "benchmarks": {
+            name: {"median_us": median} for name, median in medians.items()
+        },
+    }
+
+
+async def test_compare_flags_regressions():
+    """Test only benchmarks slower than the threshold are flagged."""
+    baseline = report(fast=10.0, slow=10.0, removed=5.0)
+    current = report(fast=11.0, slow=20.0, added=1.0)
+
+    rows = {row["name"]: row for row in compare(baseline, current, 1.25)}
+
+    assert set(rows) == {"fast", "slow"}
+    assert not rows["fast"]["regression"]
+    assert rows["slow"]["regression"]
+    assert rows["slow"]["ratio"] == 2.0
+
+
+async def test_handler_benchmarks_restore_main():
+    """Test the handler benchmarks run and leave the app state untouched."""
+    session_factory = main.AsyncSessionLocal
+    emit = main.sio.emit
+
+    results = await run_suite(rounds=1, scale=0.01, only="handlers.")
+
+    assert set(results) == {
+        "handlers.send_message",
+        "handlers.get_room_messages",
+    }
+    assert results["handlers.send_message"]["median_us"] > 0
+    assert main.AsyncSessionLocal is session_factory
+    assert main.sio.emit == emit
+    assert main.connected_users == {}
+    assert main.get_read_db not in main.app.dependency_overrides
@@ -0,0 +1,116 @@
+import asyncio
+
+import pytest
+
+from broadcast import RoomBroadcaster
+
+# Mark all tests in this file as asyncio
+pytestmark = pytest.mark.asyncio
+
+
+class FakeSio:
+    """Records emits; each emit yields to the loop like a real fan-out."""
+
+    def __init__(self):
+        self.emitted = []
+
+    async def emit(self, event, data=None, room=None, **kwargs):
+        await asyncio.sleep(0)
+        self.emitted.append((event, data, room))
+
+
+async def test_publish_does_not_wait_for_emit():
+    """Test publish returns before the fan-out happens."""
+    sio = FakeSio()
+    broadcaster = RoomBroadcaster(sio)
+
+    broadcaster.publish("room_1", "new_message", {"id": 1})
+    assert sio.emitted == []
+    assert broadcaster.metrics()["queue_depth_total"] == 1
+
+    await broadcaster.drain()
+    assert sio.emitted == [("new_message", {"id": 1}, "room_1")]
+    await broadcaster.close()
+
+
+async def test_backlog_is_batched_in_order():
+    """Test queued messages are emitted as one ordered batch."""
+    sio = FakeSio()
+    broadcaster = RoomBroadcaster(sio, max_batch=10)
+
+    for i in range(5):
+        broadcaster.publish("room_1", "new_message", {"id": i})
+    await broadcaster.drain()
+
+    assert sio.emitted == [
+        (
+            "new_message_batch",
+            {"messages": [{"id": i} for i in range(5)]},
+            "room_1",
+        )
+    ]
+    assert broadcaster.metrics()["batched_emits"] == 1
+    await broadcaster.close()
+
+
+async def test_mixed_events_keep_order():
+    """Test different events in a batch are not reordered."""
+    sio = FakeSio()
+    broadcaster = RoomBroadcaster(sio)
+
+    broadcaster.publish("dm_1", "new_dm_message", {"id": 1})
+    broadcaster.publish("dm_1", "other_event", {"id": 2})
+    broadcaster.publish("dm_1", "new_dm_message", {"id": 3})
+    await broadcaster.drain()
+
+    assert [data["id"] for _, data, _ in sio.emitted] == [1, 2, 3]
+    await broadcaster.close()
+
+
+async def test_idle_worker_is_released():
+    """Test a room's worker and queue go away after the idle timeout."""
+    sio = FakeSio()
+    broadcaster = RoomBroadcaster(sio, idle_timeout=0.01)
+
+    broadcaster.publish("room_2", "new_message", {"id": 1})
+    await broadcaster.drain()
+    await asyncio.sleep(0.05)
+
+    assert broadcaster.metrics()["rooms"] == 0
+
+
+async def test_full_queue_drops_oldest():
+    """Test a slow room's backlog is bounded, keeping the newest events."""
+    sio = FakeSio()
+    broadcaster = RoomBroadcaster(sio, max_batch=10, max_queue=3)
+
+    for i in range(5):
+        broadcaster.publish(
+            "room_1", "new_message", {"id": i, "room_id": 1}
+        )
+
+    metrics = broadcaster.metrics()
+    assert metrics["queue_depth_max"] == 3
+    assert metrics["dropped"] == 2
+
+    await broadcaster.drain()
+    assert sio.emitted == [
+        ("messages_dropped", {"room_id": 1, "dropped": 2}, "room_1"),
+        (
+            "new_message_batch",
+            {
+                "messages": [
+                    {"id": i, "room_id": 1} for i in range(2, 5)
+                ]
+            },
+            "room_1",
+        )
+    ]
+
+    # Sin nuevos descartes no se repite el aviso
+    broadcaster.publish("room_1", "new_message", {"id": 5, "room_id": 1})
+    await broadcaster.drain()
+    assert sio.emitted[-1] == (
+        "new_message", {"id": 5, "room_id": 1}, "room_1"
+    )
+    await broadcaster.close()
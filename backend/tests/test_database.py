@@ -0,0 +1,80 @@
+import pytest
+import pytest_asyncio
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import (
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+
+import database
+from models import Base, Room
+
+# Mark all tests in this file as asyncio
+pytestmark = pytest.mark.asyncio
+
+
+@pytest_asyncio.fixture
+async def primary_and_replica(tmp_path, monkeypatch):
+    """Two separate SQLite databases standing in for primary and replica."""
+    engines = []
+    factories = []
+    for name in ("primary", "replica"):
+        eng = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/{name}.db")
+        async with eng.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        engines.append(eng)
+        factories.append(
+            async_sessionmaker(eng, class_=AsyncSession, expire_on_commit=False)
+        )
+
+    monkeypatch.setattr(database, "engine", engines[0])
+    monkeypatch.setattr(database, "replica_engine", engines[1])
+    monkeypatch.setattr(database, "AsyncSessionLocal", factories[0])
+    monkeypatch.setattr(database, "ReadSessionLocal", factories[1])
+    monkeypatch.setattr(database, "_primary_pins", {})
+
+    # The write only exists on the primary (replica lagging behind)
+    async with factories[0]() as db:
+        db.add(Room(id=1, name="fresh"))
+        await db.commit()
+
+    yield
+    for eng in engines:
+        await eng.dispose()
+
+
+async def read_room_names(user_id):
+    async with database.read_session_factory(user_id)() as db:
+        result = await db.execute(select(Room.name))
+        return result.scalars().all()
+
+
+async def test_reads_go_to_replica(primary_and_replica):
+    """Test reads use the replica when the user has not written."""
+    assert await read_room_names(1) == []
+    assert await read_room_names(None) == []
+
+
+async def test_read_your_writes_pins_primary(primary_and_replica):
+    """Test a user who just wrote reads from the primary."""
+    database.mark_user_write(1)
+
+    assert await read_room_names(1) == ["fresh"]
+    assert await read_room_names(2) == []
+
+
+async def test_pin_expires(primary_and_replica, monkeypatch):
+    """Test the primary pin is dropped after the window."""
+    monkeypatch.setattr(database, "READ_YOUR_WRITES_WINDOW", 0)
+    database.mark_user_write(1)
+
+    assert await read_room_names(1) == []
+    assert database._primary_pins == {}
+
+
+async def test_pool_metrics_per_engine(primary_and_replica):
+    """Test pool metrics are reported for both engines."""
+    metrics = database.pool_metrics()
+    assert set(metrics) == {"primary", "replica", "pinned_users"}
+    assert "status" in metrics["replica"]
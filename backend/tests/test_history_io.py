@@ -0,0 +1,196 @@
+import csv
+import io
+import json
+
+import asyncpg
+import pytest
+import pytest_asyncio
+from httpx import AsyncClient
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import history_io
+import main
+from auth import create_access_token
+from models import Message, Room, User
+from tests.conftest import engine
+
+# Mark all tests in this file as asyncio
+pytestmark = pytest.mark.asyncio
+
+ADMIN = {"Authorization": f"Bearer {create_access_token({'sub': '1'})}"}
+NOT_ADMIN = {"Authorization": f"Bearer {create_access_token({'sub': '2'})}"}
+
+
+@pytest_asyncio.fixture
+async def history(db_session: AsyncSession, monkeypatch):
+    """Room 1 with three messages; user 1 is an admin."""
+    monkeypatch.setattr(main, "ADMIN_USER_IDS", {1})
+    monkeypatch.setattr(main, "engine", engine)
+    monkeypatch.setattr(main, "replica_engine", None)
+
+    db_session.add_all(
+        [
+            User(id=1, username="admin", email="a@x.com", hashed_password="x"),
+            User(id=2, username="bob", email="b@x.com", hashed_password="x"),
+            Room(id=1, name="General"),
+            Room(id=2, name="Empty"),
+        ]
+    )
+    await db_session.flush()
+    db_session.add_all(
+        [
+            Message(content="hola", sender_id=1, room_id=1),
+            Message(content='multi\nline, "quoted"', sender_id=2, room_id=1),
+            Message(content="chau", sender_id=1, room_id=1),
+        ]
+    )
+    await db_session.commit()
+
+
+async def test_export_ndjson(client: AsyncClient, history):
+    """Test a room's history streams as one JSON object per line."""
+    response = await client.get(
+        "/admin/messages/export?room_id=1", headers=ADMIN
+    )
+    assert response.status_code == 200
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [row["content"] for row in rows] == [
+        "hola",
+        'multi\nline, "quoted"',
+        "chau",
+    ]
+
+
+async def test_export_csv_by_user(client: AsyncClient, history):
+    """Test exporting a user's messages as CSV."""
+    response = await client.get(
+        "/admin/messages/export?user_id=2&format=csv", headers=ADMIN
+    )
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert [row["content"] for row in rows] == ['multi\nline, "quoted"']
+
+
+async def test_export_requires_admin(client: AsyncClient, history):
+    """Test non-admin users cannot export history."""
+    response = await client.get(
+        "/admin/messages/export?room_id=1", headers=NOT_ADMIN
+    )
+    assert response.status_code == 403
+
+
+def parse_export(body: str, fmt: str) -> list:
+    if fmt == "ndjson":
+        return [json.loads(line) for line in body.splitlines()]
+    return list(csv.DictReader(io.StringIO(body)))
+
+
+def dump_rows(rows: list, fmt: str) -> str:
+    if fmt == "ndjson":
+        return "".join(json.dumps(row) + "\n" for row in rows)
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=rows[0], lineterminator="\n")
+    writer.writeheader()
+    writer.writerows(rows)
+    return out.getvalue()
+
+
+@pytest.mark.parametrize("fmt", ["ndjson", "csv"])
+async def test_export_import_round_trip(
+    client: AsyncClient, db_session: AsyncSession, history, fmt
+):
+    """Test an export can be re-imported into another room."""
+    exported = await client.get(
+        f"/admin/messages/export?room_id=1&format={fmt}", headers=ADMIN
+    )
+    rows = parse_export(exported.text, fmt)
+    for row in rows:
+        row["room_id"] = 2
+
+    response = await client.post(
+        f"/admin/messages/import?format={fmt}",
+        content=dump_rows(rows, fmt).encode(),
+        headers=ADMIN,
+    )
+    assert response.status_code == 200
+    assert response.json() == {"imported": 3}
+
+    room = await db_session.get(Room, 2, populate_existing=True)
+    assert room.message_count == 3
+
+    reexported = await client.get(
+        f"/admin/messages/export?room_id=2&format={fmt}", headers=ADMIN
+    )
+    assert [row["content"] for row in parse_export(reexported.text, fmt)] == [
+        row["content"] for row in rows
+    ]
+
+
+async def test_import_invalid_row(client: AsyncClient, history):
+    """Test a malformed row is rejected with 400."""
+    response = await client.post(
+        "/admin/messages/import",
+        content=b'{"content": "missing ids"}\n',
+        headers=ADMIN,
+    )
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize(
+    "line",
+    [
+        b'{"room_id": null, "sender_id": 1, "content": "x"}',
+        b'{"room_id": 2, "sender_id": 1, "content": null}',
+        b'["not", "an", "object"]',
+    ],
+)
+async def test_import_mistyped_row(client: AsyncClient, history, line):
+    """Test rows with wrong JSON types are a 400, not a 500."""
+    response = await client.post(
+        "/admin/messages/import", content=line + b"\n", headers=ADMIN
+    )
+    assert response.status_code == 400
+
+
+async def test_import_unknown_room(
+    client: AsyncClient, db_session: AsyncSession, history
+):
+    """Test a row for a missing room is rejected and nothing is loaded."""
+    async with engine.connect() as conn:
+        await conn.execute(text("PRAGMA foreign_keys = ON"))
+    rows = (
+        b'{"room_id": 2, "sender_id": 1, "content": "ok"}\n'
+        b'{"room_id": 99, "sender_id": 1, "content": "orphan"}\n'
+    )
+    try:
+        response = await client.post(
+            "/admin/messages/import", content=rows, headers=ADMIN
+        )
+    finally:
+        async with engine.connect() as conn:
+            await conn.execute(text("PRAGMA foreign_keys = OFF"))
+
+    assert response.status_code == 400
+    assert "FOREIGN KEY" in response.json()["detail"]
+    count = await db_session.scalar(
+        select(func.count()).where(Message.room_id == 2)
+    )
+    assert count == 0
+
+
+async def test_import_copy_constraint_error(
+    client: AsyncClient, history, monkeypatch
+):
+    """Test driver errors from the Postgres COPY path are a 400."""
+
+    async def failing_import(conn, records):
+        raise asyncpg.ForeignKeyViolationError("violates foreign key")
+
+    monkeypatch.setattr(history_io, "import_messages", failing_import)
+    response = await client.post(
+        "/admin/messages/import",
+        content=b'{"room_id": 99, "sender_id": 1, "content": "x"}\n',
+        headers=ADMIN,
+    )
+    assert response.status_code == 400
+    assert "foreign key" in response.json()["detail"]
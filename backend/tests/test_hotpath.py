@@ -0,0 +1,100 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from hotpath import (
+    fetch_room_history,
+    fetch_user_dms,
+    insert_message,
+    is_room_member,
+)
+from models import Message, Room, RoomMembership, User
+
+# Mark all tests in this file as asyncio
+pytestmark = pytest.mark.asyncio
+
+
+async def seed_room(db: AsyncSession):
+    db.add_all(
+        [
+            User(id=1, username="alice", email="a@x.com", hashed_password="x"),
+            User(id=2, username="bob", email="b@x.com", hashed_password="x"),
+            Room(id=1, name="General"),
+        ]
+    )
+    await db.flush()
+    db.add(RoomMembership(user_id=1, room_id=1))
+    await db.commit()
+
+
+async def test_insert_message_returns_row_and_bumps_counters(
+    db_session: AsyncSession,
+):
+    """Test the Core insert returns the new id and updates room counters."""
+    await seed_room(db_session)
+
+    message = await insert_message(db_session, 1, 1, "hola")
+    await db_session.commit()
+
+    assert message.id is not None
+    assert message.as_event("alice") == {
+        "id": message.id,
+        "message": "hola",
+        "username": "alice",
+        "room_id": 1,
+        "timestamp": message.created_at.isoformat(),
+    }
+    room = await db_session.get(Room, 1, populate_existing=True)
+    assert room.message_count == 1
+    assert room.last_activity_at == message.created_at
+
+
+async def test_fetch_room_history_oldest_first(db_session: AsyncSession):
+    """Test history returns the latest messages in chronological order."""
+    await seed_room(db_session)
+    for sender_id, content in [(1, "uno"), (2, "dos"), (1, "tres")]:
+        await insert_message(db_session, sender_id, 1, content)
+    await db_session.commit()
+
+    history = await fetch_room_history(db_session, 1, limit=2)
+
+    assert [(row.content, row.username) for row in history] == [
+        ("dos", "bob"),
+        ("tres", "alice"),
+    ]
+    assert not hasattr(history[0], "__dict__")
+    assert await is_room_member(db_session, 1, 1)
+    assert not await is_room_member(db_session, 1, 2)
+
+
+async def test_dm_preview_is_latest_by_created_at(db_session: AsyncSession):
+    """Test imported older messages with newer ids don't become the preview."""
+    db_session.add_all(
+        [
+            User(id=1, username="alice", email="a@x.com", hashed_password="x"),
+            User(id=2, username="bob", email="b@x.com", hashed_password="x"),
+            Room(id=1, name="alice_bob", room_type="dm", is_private=True),
+        ]
+    )
+    await db_session.flush()
+    db_session.add_all(
+        [
+            RoomMembership(user_id=1, room_id=1),
+            RoomMembership(user_id=2, room_id=1),
+            Message(
+                id=1, content="nuevo", sender_id=2, room_id=1,
+                created_at=datetime(2025, 3, 1),
+            ),
+            # Importado después, con la fecha original
+            Message(
+                id=2, content="viejo", sender_id=2, room_id=1,
+                created_at=datetime(2024, 1, 1),
+            ),
+        ]
+    )
+    await db_session.commit()
+
+    (dm,) = await fetch_user_dms(db_session, 1)
+
+    assert dm.as_dict()["last_message"] == "nuevo"
@@ -0,0 +1,166 @@
+import pytest
+import socketio
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import main
+from auth import create_access_token
+from models import Message, Room, RoomMembership, User
+from profiling import (
+    QueryProfiler,
+    QueryProfilingMiddleware,
+    statement_shape,
+)
+from tests.conftest import engine
+
+# Mark all tests in this file as asyncio
+pytestmark = pytest.mark.asyncio
+
+
+async def seed_dms(db: AsyncSession, count: int) -> dict:
+    """Create user 1 with `count` DMs, each with a couple of messages."""
+    db.add_all(
+        User(id=i, username=f"u{i}", email=f"u{i}@x.com", hashed_password="x")
+        for i in range(1, count + 2)
+    )
+    db.add_all(
+        Room(id=i, name=f"u1_u{i + 1}", room_type="dm", is_private=True)
+        for i in range(1, count + 1)
+    )
+    await db.flush()
+    for room_id in range(1, count + 1):
+        db.add_all(
+            [
+                RoomMembership(user_id=1, room_id=room_id),
+                RoomMembership(user_id=room_id + 1, room_id=room_id),
+                Message(content="hi", sender_id=room_id + 1, room_id=room_id),
+                Message(content="yo", sender_id=1, room_id=room_id),
+            ]
+        )
+    await db.commit()
+    token = create_access_token({"sub": "1"})
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.mark.parametrize("dm_count", [1, 10])
+async def test_dms_query_budget(
+    client: AsyncClient, db_session: AsyncSession, query_budget, dm_count
+):
+    """Test the DM list issues a constant number of statements."""
+    headers = await seed_dms(db_session, dm_count)
+
+    with query_budget(4, "GET /dms"):
+        response = await client.get("/dms", headers=headers)
+
+    assert response.status_code == 200
+    dms = response.json()["dms"]
+    assert len(dms) == dm_count
+    assert dms[0]["last_message"] == "yo"
+
+
+async def test_messages_query_budget(
+    client: AsyncClient, db_session: AsyncSession, query_budget
+):
+    """Test room history is one membership check plus one select."""
+    headers = await seed_dms(db_session, 1)
+
+    with query_budget(2, "GET /messages/{room_id}"):
+        response = await client.get("/messages/1", headers=headers)
+
+    assert response.status_code == 200
+    assert len(response.json()["messages"]) == 2
+
+
+async def test_repeated_statements_flagged_as_n_plus_one(
+    db_session: AsyncSession,
+):
+    """Test the profiler flags a statement shape repeated in one scope."""
+    await seed_dms(db_session, 6)
+    profiler = QueryProfiler(n_plus_one_threshold=5)
+    profiler.attach(engine)
+    try:
+        with profiler.scope("loop"):
+            for room_id in range(1, 7):
+                await db_session.get(Room, room_id, populate_existing=True)
+    finally:
+        profiler.detach()
+
+    report = profiler.report()["loop"]
+    assert report["statements"] == 6
+    assert list(report["n_plus_one"].values()) == [6]
+
+
+async def test_statement_shape_collapses_in_lists():
+    """Test IN lists of any length normalise to the same shape."""
+    assert statement_shape("SELECT 1 WHERE id IN (?, ?, ?)") == (
+        statement_shape("SELECT 1\n WHERE id IN (?, ?)")
+    )
+
+
+async def test_failed_statement_does_not_skew_timings(
+    db_session: AsyncSession,
+):
+    """Test a statement that errors leaves no start time behind."""
+    profiler = QueryProfiler()
+    profiler.attach(engine)
+    try:
+        with profiler.scope("errors") as scope:
+            with pytest.raises(OperationalError):
+                await db_session.execute(text("SELECT * FROM missing"))
+            await db_session.rollback()
+            await db_session.execute(text("SELECT 1"))
+    finally:
+        profiler.detach()
+
+    assert scope.count == 1
+    assert "query_start" not in (await db_session.connection()).info
+    assert 0 <= scope.db_time < 1
+
+
+async def test_middleware_scopes_by_route_template(
+    client: AsyncClient, db_session: AsyncSession
+):
+    """Test REST requests are grouped by path template, not raw path."""
+    headers = await seed_dms(db_session, 2)
+    profiler = QueryProfiler()
+    profiler.attach(engine)
+    transport = ASGITransport(app=QueryProfilingMiddleware(main.app, profiler))
+    try:
+        async with AsyncClient(
+            transport=transport, base_url="http://test"
+        ) as profiled:
+            for room_id in (1, 2):
+                response = await profiled.get(
+                    f"/messages/{room_id}", headers=headers
+                )
+                assert response.status_code == 200
+    finally:
+        profiler.detach()
+
+    report = profiler.report()
+    assert set(report) == {"GET /messages/{room_id}"}
+    assert report["GET /messages/{room_id}"]["calls"] == 2
+    assert report["GET /messages/{room_id}"]["max_statements"] == 2
+
+
+async def test_instrument_sio_scopes_handlers(db_session: AsyncSession):
+    """Test registered Socket.IO handlers get a scope per event."""
+    sio = socketio.AsyncServer(async_mode="asgi")
+
+    @sio.event
+    async def ping(sid, data):
+        await db_session.execute(text("SELECT 1"))
+        return data
+
+    profiler = QueryProfiler()
+    profiler.attach(engine)
+    profiler.instrument_sio(sio)
+    try:
+        assert await sio.handlers["/"]["ping"]("sid", "pong") == "pong"
+    finally:
+        profiler.detach()
+
+    assert sio.handlers["/"]["ping"].__name__ == "ping"
+    assert profiler.report()["sio:ping"]["statements"] == 1
@@ -0,0 +1,244 @@
+import asyncio
+import base64
+import json
+from datetime import datetime, timedelta
+
+import pytest
+import pytest_asyncio
+from httpx import AsyncClient
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import (
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+
+import main
+from auth import create_access_token
+from hotpath import SocketSession
+from models import Base, Room, RoomMembership
+from tests.conftest import engine
+
+# Mark all tests in this file as asyncio
+pytestmark = pytest.mark.asyncio
+
+AUTH = {"Authorization": f"Bearer {create_access_token({'sub': '1'})}"}
+
+
+@pytest_asyncio.fixture(autouse=True)
+async def clear_room_cache():
+    main.room_directory_cache.clear()
+    yield
+    main.room_directory_cache.clear()
+
+
+async def seed_rooms(db: AsyncSession):
+    now = datetime.utcnow()
+    db.add_all(
+        [
+            Room(id=1, name="small", member_count=2,
+                 last_activity_at=now - timedelta(minutes=1)),
+            Room(id=2, name="big", member_count=50,
+                 last_activity_at=now - timedelta(hours=1)),
+            Room(id=3, name="medium", member_count=10,
+                 last_activity_at=now),
+            Room(id=4, name="tied", member_count=10,
+                 last_activity_at=now - timedelta(days=1)),
+            Room(id=5, name="secret", member_count=99, is_private=True),
+            Room(id=6, name="a_b", member_count=2, room_type="dm",
+                 is_private=True),
+        ]
+    )
+    await db.commit()
+
+
+async def test_list_rooms_by_members_paginated(
+    client: AsyncClient, db_session: AsyncSession
+):
+    """Test keyset pagination over public rooms sorted by member count."""
+    await seed_rooms(db_session)
+
+    response = await client.get("/rooms?limit=2", headers=AUTH)
+    assert response.status_code == 200
+    data = response.json()
+    assert [r["name"] for r in data["rooms"]] == ["big", "tied"]
+
+    response = await client.get(
+        f"/rooms?limit=2&cursor={data['next_cursor']}", headers=AUTH
+    )
+    data = response.json()
+    assert [r["name"] for r in data["rooms"]] == ["medium", "small"]
+    assert data["next_cursor"] is None
+
+
+async def test_list_rooms_by_activity(
+    client: AsyncClient, db_session: AsyncSession
+):
+    """Test sorting public rooms by most recent activity."""
+    await seed_rooms(db_session)
+
+    response = await client.get("/rooms?sort=activity", headers=AUTH)
+    names = [r["name"] for r in response.json()["rooms"]]
+    assert names == ["medium", "small", "big", "tied"]
+
+
+async def test_list_rooms_invalid_params(client: AsyncClient):
+    """Test unknown sort keys and malformed cursors are rejected."""
+    response = await client.get("/rooms?sort=name", headers=AUTH)
+    assert response.status_code == 400
+
+    response = await client.get("/rooms?cursor=not-a-cursor", headers=AUTH)
+    assert response.status_code == 400
+
+
+def make_cursor(value, room_id) -> str:
+    raw = json.dumps([value, room_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+async def test_activity_sort_uses_index(
+    client: AsyncClient, db_session: AsyncSession, query_budget
+):
+    """Test the activity sort is an index scan, with no sort step."""
+    now = datetime.utcnow()
+    db_session.add_all(
+        [
+            Room(id=1, name="idle", last_activity_at=now - timedelta(days=2)),
+            Room(id=2, name="active", last_activity_at=now),
+        ]
+    )
+    await db_session.commit()
+
+    with query_budget(1, "GET /rooms") as scope:
+        response = await client.get("/rooms?sort=activity", headers=AUTH)
+
+    assert response.status_code == 200
+    assert [r["name"] for r in response.json()["rooms"]] == [
+        "active",
+        "idle",
+    ]
+    (statement,) = scope.shapes
+    async with engine.connect() as conn:
+        plan = await conn.exec_driver_sql(
+            f"EXPLAIN QUERY PLAN {statement}",
+            (None,) * statement.count("?"),
+        )
+        details = " ".join(row[-1] for row in plan)
+    assert "USING INDEX ix_rooms_last_activity_at" in details
+    assert "TEMP B-TREE" not in details
+
+
+@pytest.mark.parametrize(
+    "sort,cursor",
+    [
+        ("members", make_cursor("10", 1)),
+        ("members", make_cursor(None, 1)),
+        ("members", make_cursor(True, 1)),
+        ("members", make_cursor(10, "1")),
+        ("activity", make_cursor(None, 1)),
+        ("activity", make_cursor(10, 1)),
+        ("activity", make_cursor("2024-01-01T00:00:00", 1.5)),
+        ("members", base64.urlsafe_b64encode(b'{"a": 1}').decode()),
+    ],
+)
+async def test_list_rooms_rejects_mistyped_cursor(
+    client: AsyncClient, db_session: AsyncSession, sort, cursor
+):
+    """Test crafted cursors with the wrong types are a 400, not a DB error."""
+    response = await client.get(
+        f"/rooms?sort={sort}&cursor={cursor}", headers=AUTH
+    )
+    assert response.status_code == 400
+
+
+async def test_room_counters_follow_writes(
+    db_session: AsyncSession, sio_emits
+):
+    """Test joins and messages keep the directory counters in sync."""
+    db_session.add_all(
+        [
+            Room(id=1, name="General"),
+            Room(id=2, name="a_b", room_type="dm", is_private=True),
+        ]
+    )
+    await db_session.commit()
+
+    sids = []
+    for user_id, username in [(1, "alice"), (2, "bob")]:
+        sid = await main.sio.manager.connect(f"eio-{user_id}", "/")
+        main.connected_users[sid] = SocketSession(
+            user_id=user_id, username=username, status="online", sid=sid
+        )
+        sids.append(sid)
+    alice, bob = sids
+    await main.join_room(alice, {"room_id": 1})
+    await main.join_room(alice, {"room_id": 1})
+    await main.join_room(bob, {"room_id": 1})
+    await main.join_room(alice, {"room_id": 2})
+
+    await main.send_message(alice, {"room_id": 1, "message": "hola"})
+    await main.broadcaster.drain()
+
+    room = await db_session.get(Room, 1, populate_existing=True)
+    assert room.member_count == 2
+    assert room.message_count == 1
+
+    # Unirse a un DM ajeno no crea membresía
+    memberships = await db_session.execute(
+        select(RoomMembership.room_id, RoomMembership.user_id)
+    )
+    assert sorted(memberships.all()) == [(1, 1), (1, 2)]
+
+
+async def test_rejoin_does_not_broadcast(db_session: AsyncSession, sio_emits):
+    """Test joining a room the user already belongs to is silent."""
+    db_session.add(Room(id=1, name="General"))
+    await db_session.commit()
+    sid = await main.sio.manager.connect("eio-rejoin", "/")
+    main.connected_users[sid] = SocketSession(
+        user_id=1, username="alice", status="online", sid=sid
+    )
+
+    await main.join_room(sid, {"room_id": 1})
+    await main.join_room(sid, {"room_id": 1})
+
+    joined = [
+        data for event, data, _ in sio_emits if event == "user_joined_room"
+    ]
+    assert joined == [{"user": "alice", "room_id": 1}]
+    participants = dict(main.sio.manager.get_participants("/", "room_1"))
+    assert sid in participants
+
+
+async def test_concurrent_joins_count_once(sio_emits, tmp_path, monkeypatch):
+    """Test racing join_room calls add one membership and one member."""
+    # Una conexión por sesión, como en producción (el engine de los tests
+    # comparte una sola y el rollback de una sesión deshace la otra)
+    file_engine = create_async_engine(
+        f"sqlite+aiosqlite:///{tmp_path / 'race.db'}"
+    )
+    session_factory = async_sessionmaker(file_engine, expire_on_commit=False)
+    async with file_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with session_factory() as db:
+        db.add(Room(id=1, name="General"))
+        await db.commit()
+    monkeypatch.setattr(main, "AsyncSessionLocal", session_factory)
+
+    sid = await main.sio.manager.connect("eio-race", "/")
+    main.connected_users[sid] = SocketSession(
+        user_id=1, username="alice", status="online", sid=sid
+    )
+    try:
+        await asyncio.gather(
+            main.join_room(sid, {"room_id": 1}),
+            main.join_room(sid, {"room_id": 1}),
+        )
+
+        async with session_factory() as db:
+            room = await db.get(Room, 1)
+            memberships = await db.execute(select(RoomMembership.user_id))
+            assert memberships.scalars().all() == [1]
+            assert room.member_count == 1
+    finally:
+        await file_engine.dispose()
@@ -0,0 +1,95 @@
+import asyncio
+
+import pytest
+
+from scheduler import Scheduler
+from tests.conftest import engine
+
+# Mark all tests in this file as asyncio
+pytestmark = pytest.mark.asyncio
+
+
+async def test_run_job_records_duration():
+    """Test a successful run updates the job metrics."""
+    scheduler = Scheduler(engine)
+    calls = []
+
+    async def job():
+        calls.append(1)
+
+    scheduler.add_job("ok", job, interval=60)
+    await scheduler.run_job(scheduler.jobs["ok"])
+
+    metrics = scheduler.metrics()["ok"]
+    assert calls == [1]
+    assert metrics["runs"] == 1
+    assert metrics["failures"] == 0
+    assert metrics["last_duration"] is not None
+
+
+async def test_run_job_timeout_and_failure():
+    """Test timeouts and exceptions are counted, not raised."""
+    scheduler = Scheduler(engine)
+
+    async def slow():
+        await asyncio.sleep(1)
+
+    async def broken():
+        raise RuntimeError("boom")
+
+    scheduler.add_job("slow", slow, interval=60, timeout=0.01)
+    scheduler.add_job("broken", broken, interval=60)
+    await scheduler.run_job(scheduler.jobs["slow"])
+    await scheduler.run_job(scheduler.jobs["broken"])
+
+    metrics = scheduler.metrics()
+    assert metrics["slow"]["timeouts"] == 1
+    assert metrics["broken"]["failures"] == 1
+
+
+async def test_singleton_runs_without_postgres():
+    """Test singleton jobs run when there is no advisory lock to take."""
+    scheduler = Scheduler(engine)
+    calls = []
+
+    async def job():
+        calls.append(1)
+
+    scheduler.add_job("leader_only", job, interval=60, singleton=True)
+    await scheduler.run_job(scheduler.jobs["leader_only"])
+
+    assert calls == [1]
+    assert scheduler.metrics()["leader_only"]["skipped"] == 0
+
+
+async def test_duplicate_job_name_rejected():
+    """Test registering the same job name twice fails."""
+    scheduler = Scheduler(engine)
+
+    async def job():
+        pass
+
+    scheduler.add_job("dup", job, interval=60)
+    with pytest.raises(ValueError):
+        scheduler.add_job("dup", job, interval=60)
+
+
+async def test_leader_lock_uses_dedicated_autocommit_engine():
+    """Test the advisory lock does not borrow a pooled, transactional conn."""
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from sqlalchemy.pool import NullPool
+
+    app_engine = create_async_engine("postgresql+asyncpg://u:pw@db/chat")
+    scheduler = Scheduler(app_engine)
+
+    lock_engine = scheduler.lock_engine()
+
+    assert lock_engine is not app_engine
+    assert lock_engine is scheduler.lock_engine()
+    assert isinstance(lock_engine.pool, NullPool)
+    assert lock_engine.url == app_engine.url
+    dialect = lock_engine.sync_engine.dialect
+    assert dialect._on_connect_isolation_level == "AUTOCOMMIT"
+
+    await scheduler.stop()
+    assert scheduler._lock_engine is None
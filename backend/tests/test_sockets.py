@@ -0,0 +1,226 @@
+import asyncio
+import os
+import subprocess
+import sys
+
+import pytest
+from socketio.exceptions import ConnectionRefusedError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import main
+from auth import create_access_token, create_user
+from hotpath import SocketSession
+from models import Room, RoomMembership
+
+# Mark all tests in this file as asyncio
+pytestmark = pytest.mark.asyncio
+
+
+async def connect_fake_socket(eio_sid: str) -> str:
+    """Register a socket in the Socket.IO manager without a transport."""
+    return await main.sio.manager.connect(eio_sid, "/")
+
+
+async def create_dm_rooms(db: AsyncSession, user_id: int, count: int):
+    rooms = [
+        Room(name=f"dm_{i}", is_private=True, room_type="dm")
+        for i in range(count)
+    ]
+    db.add_all(rooms)
+    await db.flush()
+    db.add_all(
+        RoomMembership(user_id=user_id, room_id=room.id) for room in rooms
+    )
+    room_ids = [room.id for room in rooms]
+    await db.commit()
+    return room_ids
+
+
+async def test_authenticate_auto_join(db_session: AsyncSession, sio_emits):
+    """Test auto_join subscribes the socket to every membership room."""
+    user = await create_user(db_session, "alice", "a@example.com", "pw")
+    token = create_access_token({"sub": str(user.id)})
+    room_ids = await create_dm_rooms(db_session, user.id, 3)
+    sid = await connect_fake_socket("eio-auto-join")
+
+    await main.authenticate(sid, {"token": token, "auto_join": True})
+
+    events = {event: data for event, data, _ in sio_emits}
+    assert sorted(events["authenticated"]["rooms"]) == sorted(room_ids)
+    assert "user_joined_room" not in events
+    for room_id in room_ids:
+        participants = dict(
+            main.sio.manager.get_participants("/", f"dm_{room_id}")
+        )
+        assert sid in participants
+
+
+async def test_authenticate_without_auto_join(
+    db_session: AsyncSession, sio_emits
+):
+    """Test the default authenticate does not join any room."""
+    user = await create_user(db_session, "bob", "b@example.com", "pw")
+    token = create_access_token({"sub": str(user.id)})
+    await create_dm_rooms(db_session, user.id, 2)
+    sid = await connect_fake_socket("eio-no-auto-join")
+
+    await main.authenticate(sid, {"token": token})
+
+    events = {event: data for event, data, _ in sio_emits}
+    assert "rooms" not in events["authenticated"]
+
+
+async def test_expire_typing_emits_stop(db_session: AsyncSession, sio_emits):
+    """Test stale typing indicators are cleared by the maintenance job."""
+    main.connected_users["sid-typing"] = SocketSession(
+        user_id=1, username="carol", status="online", sid="sid-typing"
+    )
+    await main.typing_start("sid-typing", {"room_id": 1})
+    main.typing_users[("sid-typing", 1)] -= main.TYPING_TIMEOUT + 1
+
+    await main.expire_typing()
+
+    assert ("typing_stop", {"username": "carol", "room_id": 1}, "room_1") in (
+        sio_emits
+    )
+    assert main.typing_users == {}
+
+
+async def test_connect_with_handshake_token(
+    db_session: AsyncSession, sio_emits
+):
+    """Test a valid handshake token authenticates without a round-trip."""
+    user = await create_user(db_session, "dave", "d@example.com", "pw")
+    token = create_access_token({"sub": str(user.id)})
+    sid = await connect_fake_socket("eio-handshake")
+
+    await main.connect(sid, {"REMOTE_ADDR": "10.0.0.1"}, {"token": token})
+
+    events = {event: data for event, data, _ in sio_emits}
+    assert events["authenticated"]["user"]["username"] == "dave"
+    assert events["authenticated"]["rooms"] == []
+    assert main.connected_users[sid].username == "dave"
+    assert sid not in main.unauthenticated_sockets
+
+
+async def test_connect_rejects_invalid_token(sio_emits):
+    """Test an invalid handshake token is refused before any state."""
+    with pytest.raises(ConnectionRefusedError):
+        await main.connect(
+            "sid-bad", {"REMOTE_ADDR": "10.0.0.2"}, {"token": "garbage"}
+        )
+
+    assert main.socket_ips == {}
+    assert main.connected_users == {}
+
+
+async def test_connect_per_ip_cap(sio_emits, monkeypatch):
+    """Test connections above the per-IP cap are refused."""
+    monkeypatch.setattr(main, "MAX_CONNECTIONS_PER_IP", 2)
+    environ = {"REMOTE_ADDR": "10.0.0.3"}
+
+    await main.connect("sid-a", environ)
+    await main.connect("sid-b", environ)
+    with pytest.raises(ConnectionRefusedError):
+        await main.connect("sid-c", environ)
+
+    await main.disconnect("sid-a")
+    await main.connect("sid-c", environ)
+    assert main.connections_by_ip["10.0.0.3"] == 2
+
+
+async def test_unauthenticated_socket_times_out(sio_emits, monkeypatch):
+    """Test sockets that never authenticate are disconnected."""
+    disconnected = []
+
+    async def fake_disconnect(sid, **kwargs):
+        disconnected.append(sid)
+
+    monkeypatch.setattr(main.sio, "disconnect", fake_disconnect)
+    await main.connect("sid-idle", {"REMOTE_ADDR": "10.0.0.4"})
+    main.unauthenticated_sockets["sid-idle"] -= (
+        main.UNAUTHENTICATED_TIMEOUT + 1
+    )
+
+    await main.expire_unauthenticated()
+
+    assert disconnected == ["sid-idle"]
+
+
+async def test_connect_reserves_slot_before_auth(
+    db_session: AsyncSession, sio_emits, monkeypatch
+):
+    """Test concurrent handshakes from one IP cannot overshoot the cap."""
+    monkeypatch.setattr(main, "MAX_CONNECTIONS_PER_IP", 1)
+    user = await create_user(db_session, "erin", "e@example.com", "pw")
+    token = create_access_token({"sub": str(user.id)})
+    environ = {"REMOTE_ADDR": "10.0.0.5"}
+    release = asyncio.Event()
+    get_user = main.get_current_user_ws
+
+    async def slow_get_user(token):
+        await release.wait()
+        return await get_user(token)
+
+    monkeypatch.setattr(main, "get_current_user_ws", slow_get_user)
+    sid = await connect_fake_socket("eio-slow")
+    first = asyncio.create_task(main.connect(sid, environ, {"token": token}))
+    await asyncio.sleep(0)
+
+    with pytest.raises(ConnectionRefusedError):
+        await main.connect("sid-second", environ, {"token": token})
+
+    release.set()
+    await first
+    assert main.connections_by_ip == {"10.0.0.5": 1}
+    assert main.socket_ips == {sid: "10.0.0.5"}
+
+
+async def test_connect_releases_slot_when_session_fails(
+    db_session: AsyncSession, sio_emits, monkeypatch
+):
+    """Test a failing start_session does not leak the per-IP slot."""
+    user = await create_user(db_session, "frank", "f@example.com", "pw")
+    token = create_access_token({"sub": str(user.id)})
+
+    async def broken_start_session(sid, user, auto_join=False):
+        main.connected_users[sid] = SocketSession(
+            user_id=user.id, username=user.username, status="online", sid=sid
+        )
+        raise RuntimeError("db down")
+
+    monkeypatch.setattr(main, "start_session", broken_start_session)
+    with pytest.raises(RuntimeError):
+        await main.connect(
+            "sid-broken", {"REMOTE_ADDR": "10.0.0.6"}, {"token": token}
+        )
+
+    assert main.socket_ips == {}
+    assert main.connections_by_ip == {}
+    assert main.connected_users == {}
+
+
+async def test_connection_limits_from_env():
+    """Test the connection limits are read from the environment."""
+    env = dict(
+        os.environ,
+        MAX_CONNECTIONS="7",
+        MAX_CONNECTIONS_PER_IP="3",
+        UNAUTHENTICATED_TIMEOUT="2.5",
+        REQUIRE_HANDSHAKE_AUTH="true",
+    )
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import main; print(main.MAX_CONNECTIONS, "
+            "main.MAX_CONNECTIONS_PER_IP, main.UNAUTHENTICATED_TIMEOUT, "
+            "main.REQUIRE_HANDSHAKE_AUTH)",
+        ],
+        capture_output=True,
+        text=True,
+        env=env,
+        check=True,
+    )
+
+    assert result.stdout.split()[-4:] == ["7", "3", "2.5", "True"]
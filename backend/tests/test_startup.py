@@ -0,0 +1,167 @@
+import pytest
+import pytest_asyncio
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import inspect, select, text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+import database
+import main
+from models import Room
+from tests.conftest import TestingSessionLocal, engine
+
+# Mark all tests in this file as asyncio
+pytestmark = pytest.mark.asyncio
+
+
+async def test_default_rooms_are_idempotent(
+    db_session: AsyncSession, monkeypatch
+):
+    """Test seeding default rooms twice inserts them only once."""
+    monkeypatch.setattr(main, "AsyncSessionLocal", TestingSessionLocal)
+
+    assert await main.create_default_rooms() == 1
+    assert await main.create_default_rooms() == 0
+
+    result = await db_session.execute(select(Room))
+    assert [room.name for room in result.scalars()] == ["General"]
+
+
+async def test_init_db_skips_create_all_when_versioned(
+    db_session: AsyncSession, monkeypatch
+):
+    """Test a DB stamped by a newer deploy is not touched."""
+    monkeypatch.setattr(database, "engine", engine)
+    monkeypatch.setattr(database, "DB_SCHEMA_MODE", "auto")
+
+    async with engine.begin() as conn:
+        await conn.execute(text("DROP TABLE messages"))
+        await conn.execute(
+            text("CREATE TABLE alembic_version (version_num VARCHAR(32))")
+        )
+        await conn.execute(
+            text("INSERT INTO alembic_version VALUES ('abc123')")
+        )
+
+    assert await database.init_db() == "abc123"
+
+    async with engine.connect() as conn:
+        has_messages = await conn.run_sync(
+            lambda sync_conn: inspect(sync_conn).has_table("messages")
+        )
+        await conn.execute(text("DROP TABLE alembic_version"))
+        await conn.commit()
+    assert not has_messages
+
+
+@pytest_asyncio.fixture
+async def schema_engine(monkeypatch):
+    """An empty in-memory DB wired into database.init_db."""
+    schema_engine = create_async_engine(
+        "sqlite+aiosqlite:///:memory:", poolclass=StaticPool
+    )
+    monkeypatch.setattr(database, "engine", schema_engine)
+    monkeypatch.setattr(database, "DB_SCHEMA_MODE", "auto")
+    yield schema_engine
+    await schema_engine.dispose()
+
+
+def upgrade_to(sync_conn, revision: str):
+    config = Config(database.ALEMBIC_INI)
+    config.attributes["connection"] = sync_conn
+    command.upgrade(config, revision)
+
+
+async def test_init_db_migrates_legacy_schema(schema_engine):
+    """Test a pre-migrations DB gets the room counters backfilled."""
+    async with schema_engine.begin() as conn:
+        await conn.run_sync(upgrade_to, "0001")
+        # Como una DB creada por create_all antes de versionar
+        await conn.execute(text("DROP TABLE alembic_version"))
+        await conn.execute(
+            text(
+                "INSERT INTO users (id, username, email, hashed_password) "
+                "VALUES (1, 'alice', 'a@x.com', 'x'), (2, 'bob', 'b@x.com', 'x')"
+            )
+        )
+        await conn.execute(
+            text(
+                "INSERT INTO rooms (id, name, created_at) VALUES "
+                "(1, 'General', '2024-01-01 00:00:00'), "
+                "(2, 'Empty', '2024-02-01 00:00:00')"
+            )
+        )
+        await conn.execute(
+            text(
+                "INSERT INTO room_memberships (user_id, room_id) "
+                "VALUES (1, 1), (2, 1), (1, 1)"
+            )
+        )
+        await conn.execute(
+            text(
+                "INSERT INTO messages (content, sender_id, room_id, created_at) "
+                "VALUES ('a', 1, 1, '2024-03-01 00:00:00'), "
+                "('b', 2, 1, '2024-03-02 00:00:00')"
+            )
+        )
+
+    assert await database.init_db() == "0002"
+
+    async with schema_engine.connect() as conn:
+        rooms = (
+            await conn.execute(
+                text(
+                    "SELECT id, member_count, message_count, last_activity_at "
+                    "FROM rooms ORDER BY id"
+                )
+            )
+        ).all()
+        has_refresh_tokens = await conn.run_sync(
+            lambda sync_conn: inspect(sync_conn).has_table("refresh_tokens")
+        )
+    assert [tuple(room) for room in rooms] == [
+        (1, 2, 2, "2024-03-02 00:00:00"),
+        (2, 0, 0, "2024-02-01 00:00:00"),
+    ]
+    assert has_refresh_tokens
+
+    # Ya versionada: el siguiente arranque no toca el schema
+    assert await database.init_db() == "0002"
+
+
+async def test_init_db_upgrades_stale_revision(schema_engine):
+    """Test a DB stamped at an older revision is migrated to head."""
+    async with schema_engine.begin() as conn:
+        await conn.run_sync(upgrade_to, "0001")
+        await conn.execute(
+            text(
+                "INSERT INTO rooms (id, name, created_at) "
+                "VALUES (1, 'General', '2024-01-01 00:00:00')"
+            )
+        )
+
+    assert await database.init_db() == "0002"
+
+    async with schema_engine.connect() as conn:
+        room = (
+            await conn.execute(
+                text("SELECT member_count, last_activity_at FROM rooms")
+            )
+        ).one()
+        has_refresh_tokens = await conn.run_sync(
+            lambda sync_conn: inspect(sync_conn).has_table("refresh_tokens")
+        )
+    assert tuple(room) == (0, "2024-01-01 00:00:00")
+    assert has_refresh_tokens
+
+
+async def test_init_db_creates_and_stamps_new_db(schema_engine):
+    """Test an empty DB is created from the models and stamped at head."""
+    assert await database.init_db() == "0002"
+
+    async with schema_engine.connect() as conn:
+        tables = await conn.run_sync(
+            lambda sync_conn: set(inspect(sync_conn).get_table_names())
+        )
+    assert {"rooms", "messages", "refresh_tokens", "alembic_version"} <= tables
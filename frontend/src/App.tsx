@@ -1,8 +1,8 @@
 // App.tsx con DMs
-import { useState } from 'react'
 import { AuthLayout } from './components/auth/AuthLayout'
 import { LoginForm } from './components/auth/LoginForm'
 import { ChatLayout } from './components/chat/ChatLayout'
+import { useAuth } from './hooks/useAuth'
 import { useSocket } from './hooks/useSocket'
 
 interface User {
@@ -12,7 +12,7 @@ interface User {
 }
 
 function App() {
-    const [token, setToken] = useState<string | null>(localStorage.getItem('token'))
+    const { token, login, refresh, logout } = useAuth()
     const {
         socket,
         messages,
@@ -25,16 +25,15 @@ function App() {
         user,
         createDM,
         switchToRoom
-    } = useSocket(token)
+    } = useSocket(token, refresh)
 
-    const handleLogin = (accessToken: string, userData: User) => {
-        localStorage.setItem('token', accessToken)
-        setToken(accessToken)
+    const handleLogin = (accessToken: string, refreshToken: string, userData: User) => {
+        login(accessToken, refreshToken)
     }
 
     const handleLogout = () => {
-        localStorage.removeItem('token')
-        setToken(null)
+        // Revoca el refresh token en el servidor
+        logout()
         if (socket) {
             socket.close()
         }
@@ -2,7 +2,7 @@ import { useState } from 'react'
 import toast from 'react-hot-toast'
 
 interface LoginFormProps {
-    onLogin: (token: string, user: any) => void
+    onLogin: (token: string, refreshToken: string, user: any) => void
 }
 
 export const LoginForm = ({ onLogin }: LoginFormProps) => {
@@ -22,7 +22,7 @@ export const LoginForm = ({ onLogin }: LoginFormProps) => {
 
             const data = await response.json()
             if (response.ok) {
-                onLogin(data.access_token, data.user)
+                onLogin(data.access_token, data.refresh_token, data.user)
             } else {
                 toast.error(data.detail || 'Login failed')
             }
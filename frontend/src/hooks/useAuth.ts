@@ -0,0 +1,99 @@
+import { useCallback, useEffect, useRef, useState } from 'react'
+
+// Renovar el access token un minuto antes de que venza
+const REFRESH_MARGIN_MS = 60_000
+
+// Vencimiento (ms) del claim `exp` del JWT, sin verificar la firma
+const tokenExpiry = (token: string): number | null => {
+    try {
+        const payload = token.split('.')[1].replace(/-/g, '+').replace(/_/g, '/')
+        const { exp } = JSON.parse(atob(payload))
+        return typeof exp === 'number' ? exp * 1000 : null
+    } catch {
+        return null
+    }
+}
+
+export const useAuth = () => {
+    const [token, setToken] = useState<string | null>(localStorage.getItem('token'))
+    // Un solo refresh a la vez: el refresh token rota y el viejo deja de valer
+    const refreshing = useRef<Promise<string | null> | null>(null)
+
+    const saveTokens = (accessToken: string, refreshToken: string) => {
+        localStorage.setItem('token', accessToken)
+        localStorage.setItem('refresh_token', refreshToken)
+        setToken(accessToken)
+    }
+
+    const clearTokens = () => {
+        localStorage.removeItem('token')
+        localStorage.removeItem('refresh_token')
+        setToken(null)
+    }
+
+    const login = useCallback((accessToken: string, refreshToken: string) => {
+        saveTokens(accessToken, refreshToken)
+    }, [])
+
+    // Nuevo access token sin volver a pedir el password (null si hay que loguearse)
+    const refresh = useCallback((): Promise<string | null> => {
+        if (refreshing.current) return refreshing.current
+
+        const refreshToken = localStorage.getItem('refresh_token')
+        if (!refreshToken) {
+            clearTokens()
+            return Promise.resolve(null)
+        }
+
+        refreshing.current = (async () => {
+            try {
+                const response = await fetch('http://localhost:8000/auth/refresh', {
+                    method: 'POST',
+                    headers: { 'Content-Type': 'application/json' },
+                    body: JSON.stringify({ refresh_token: refreshToken })
+                })
+                if (!response.ok) {
+                    // Vencido o revocado: volver al login
+                    clearTokens()
+                    return null
+                }
+                const data = await response.json()
+                saveTokens(data.access_token, data.refresh_token)
+                return data.access_token as string
+            } catch (error) {
+                console.error('Error refreshing token:', error)
+                return null
+            } finally {
+                refreshing.current = null
+            }
+        })()
+        return refreshing.current
+    }, [])
+
+    const logout = useCallback(async () => {
+        const refreshToken = localStorage.getItem('refresh_token')
+        clearTokens()
+        if (!refreshToken) return
+
+        try {
+            await fetch('http://localhost:8000/auth/logout', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ refresh_token: refreshToken })
+            })
+        } catch (error) {
+            console.error('Error revoking refresh token:', error)
+        }
+    }, [])
+
+    useEffect(() => {
+        if (!token) return
+        const expiry = tokenExpiry(token)
+        if (expiry === null) return
+
+        const timer = setTimeout(refresh, Math.max(expiry - Date.now() - REFRESH_MARGIN_MS, 0))
+        return () => clearTimeout(timer)
+    }, [token, refresh])
+
+    return { token, login, refresh, logout }
+}
@@ -29,7 +29,8 @@ interface DM {
     unread_count?: number
 }
 
-export const useSocket = (token: string | null) => {
+// onTokenExpired: renovar el access token (null si hay que volver al login)
+export const useSocket = (token: string | null, onTokenExpired: () => Promise<string | null>) => {
     const [socket, setSocket] = useState<Socket | null>(null)
     const [allMessages, setAllMessages] = useState<Message[]>([])
     const [dms, setDms] = useState<DM[]>([])
@@ -41,6 +42,9 @@ export const useSocket = (token: string | null) => {
     const [user, setUser] = useState<User | null>(null)
 
     const currentRoomRef = useRef(currentRoom)
+    // Token vigente para fetches y reconexiones sin recrear el socket
+    const tokenRef = useRef(token)
+    const dmsRef = useRef(dms)
     const { notifyNewMessage } = useNotifications()
 
     useEffect(() => {
@@ -48,17 +52,27 @@ export const useSocket = (token: string | null) => {
     }, [currentRoom])
 
     useEffect(() => {
-        if (isAuthenticated && token) {
+        dmsRef.current = dms
+    }, [dms])
+
+    useEffect(() => {
+        tokenRef.current = token
+    }, [token])
+
+    const hasToken = token !== null
+
+    useEffect(() => {
+        if (isAuthenticated && hasToken) {
             loadDMs()
         }
-    }, [isAuthenticated, token])
+    }, [isAuthenticated, hasToken])
 
     const loadDMs = async () => {
-        if (!token) return
+        if (!tokenRef.current) return
 
         try {
             const response = await fetch('http://localhost:8000/dms', {
-                headers: { 'Authorization': `Bearer ${token}` }
+                headers: { 'Authorization': `Bearer ${tokenRef.current}` }
             })
             const data = await response.json()
             setDms(data.dms || [])
@@ -68,11 +82,11 @@ export const useSocket = (token: string | null) => {
     }
 
     const loadRoomMessages = async (roomId: number, roomType: 'public' | 'dm') => {
-        if (!token) return
+        if (!tokenRef.current) return
 
         try {
             const response = await fetch(`http://localhost:8000/messages/${roomId}`, {
-                headers: { 'Authorization': `Bearer ${token}` }
+                headers: { 'Authorization': `Bearer ${tokenRef.current}` }
             })
             const data = await response.json()
 
@@ -93,12 +107,31 @@ export const useSocket = (token: string | null) => {
     }
 
     useEffect(() => {
-        if (token) {
-            const newSocket = io('http://localhost:8000')
+        if (hasToken) {
+            // El token va en el handshake: el servidor autentica al conectar.
+            // Se evalúa en cada (re)conexión, así usa el token renovado
+            const newSocket = io('http://localhost:8000', {
+                auth: (cb) => cb({ token: tokenRef.current, auto_join: true })
+            })
 
             newSocket.on('connect', () => {
                 setIsConnected(true)
-                newSocket.emit('authenticate', { token })
+            })
+
+            newSocket.on('connect_error', async (error) => {
+                if (error.message !== 'Invalid token') {
+                    toast.error(error.message)
+                    return
+                }
+                // Access token vencido: renovarlo con el refresh token y
+                // reintentar (un handshake rechazado no se reintenta solo)
+                const newToken = await onTokenExpired()
+                if (newToken) {
+                    tokenRef.current = newToken
+                    newSocket.connect()
+                } else {
+                    toast.error('Session expired, please sign in again')
+                }
             })
 
             newSocket.on('disconnect', () => {
@@ -110,7 +143,11 @@ export const useSocket = (token: string | null) => {
                 setUser(data.user)
                 setIsAuthenticated(true)
                 toast.success(`Welcome back, ${data.user.username}!`)
-                newSocket.emit('join_room', { room_id: 1 })
+                // Con auto_join el servidor ya suscribió el socket a sus rooms;
+                // solo se une a General la primera vez (sin membresía)
+                if (!data.rooms?.includes(1)) {
+                    newSocket.emit('join_room', { room_id: 1 })
+                }
                 // Cargar mensajes del room público inicial
                 loadRoomMessages(1, 'public')
             })
@@ -123,13 +160,27 @@ export const useSocket = (token: string | null) => {
                 setOnlineUsers(data.users)
             })
 
-            newSocket.on('new_message', (data) => {
+            const handleNewMessage = (data: Message) => {
                 setAllMessages(prev => [...prev, { ...data, roomType: 'public' as const }])
 
                 // Notificar si no estás en ese room
                 if (currentRoomRef.current.type !== 'public' || currentRoomRef.current.id !== data.room_id) {
                     notifyNewMessage(data.username, data.message, false)
                 }
+            }
+
+            newSocket.on('new_message', handleNewMessage)
+
+            // Bajo carga el servidor agrupa varios mensajes en un solo emit
+            newSocket.on('new_message_batch', (data: { messages: Message[] }) => {
+                data.messages.forEach(handleNewMessage)
+            })
+
+            // El servidor descartó eventos de un room saturado: los mensajes
+            // están en la DB, recargar el historial de ese room
+            newSocket.on('messages_dropped', (data: { room_id: number, dropped: number }) => {
+                const isDM = dmsRef.current.some(dm => dm.id === data.room_id)
+                loadRoomMessages(data.room_id, isDM ? 'dm' : 'public')
             })
 
             newSocket.on('dm_created', (data) => {
@@ -154,7 +205,7 @@ export const useSocket = (token: string | null) => {
                 loadRoomMessages(data.id, 'dm')
             })
 
-            newSocket.on('new_dm_message', (data) => {
+            const handleNewDMMessage = (data: Message) => {
                 setAllMessages(prev => [...prev, { ...data, roomType: 'dm' as const }])
 
                 // Notificar si no estás en ese DM
@@ -167,6 +218,12 @@ export const useSocket = (token: string | null) => {
                             : dm
                     ))
                 }
+            }
+
+            newSocket.on('new_dm_message', handleNewDMMessage)
+
+            newSocket.on('new_dm_message_batch', (data: { messages: Message[] }) => {
+                data.messages.forEach(handleNewDMMessage)
             })
 
             newSocket.on('dm_error', (data) => {
@@ -192,7 +249,7 @@ export const useSocket = (token: string | null) => {
                 newSocket.close()
             }
         }
-    }, [token])
+    }, [hasToken])
 
     const createDM = (targetUsername: string) => {
         if (socket) {